@@ -5,17 +5,19 @@ Last update: 2024-09-07
 
 Program to create an inverted index (term-document sparse matrix) with either a vector model (tf-idf) or OkapiBM25 model.
 This program is based on the gensim Python library. See https://github.com/RaRe-Technologies/gensim/#documentation .
-Usage: python index.py -docs <doc folder> -index <index folder> -language <english|spanish>
+Usage: python index.py -docs <doc folder> -index <index folder> -language <english|spanish> [-model <tfidf|okapi>] [-shardsize <docs>] [-workers <N>]
 """
 
 import os
 import pprint
 import sys
 import xml.etree.ElementTree as ET
+from multiprocessing import Pool
 
 from gensim import corpora
 from gensim import models
 from gensim import similarities
+from gensim import utils
 from nltk.stem.snowball import SnowballStemmer
 
 import json
@@ -23,8 +25,6 @@ import json
 LANGUAGE = 'english'
 #LANGUAGE = 'spanish'
 
-STOP_LIST = None
-
 def create_folder(folder_name):
     if (not os.path.exists(folder_name)):
         os.mkdir(folder_name)
@@ -48,15 +48,92 @@ def get_paths_file_name(folder_name):
     create_folder(folder_name)
     return os.path.join(folder_name, 'paths.json')
 
-def apply_stemming(words):
-    # the stemmer requires a language parameter
-    snow_stemmer = SnowballStemmer(language=LANGUAGE)
+def get_shard_file_name(folder_name, shard_no):
+    create_folder(folder_name)
+    return os.path.join(folder_name, f'index.shard{shard_no}')
+
+def get_corpus_file_name(folder_name):
+    create_folder(folder_name)
+    return os.path.join(folder_name, 'corpus.mm')
+
+def get_metadata_file_name(folder_name):
+    create_folder(folder_name)
+    return os.path.join(folder_name, 'metadata.json')
+
+def store_metadata(index_folder, model_type, num_features, num_docs, shard_sizes=None):
+    # The searcher reads the model type to load the matching model, and the shard sizes if the index is sharded
+    metadata = {'model_type': model_type, 'language': LANGUAGE,
+                'num_features': num_features, 'num_docs': num_docs}
+    if shard_sizes is not None:
+        metadata['shards'] = shard_sizes
+    with open(get_metadata_file_name(index_folder), 'w') as f:
+        json.dump(metadata, f)
+
+def load_metadata(index_folder):
+    # Indexes created before the metadata file existed were always tf-idf
+    metadata_file_name = get_metadata_file_name(index_folder)
+    if not os.path.exists(metadata_file_name):
+        return {'model_type': 'tfidf'}
+    with open(metadata_file_name, 'r') as f:
+        return json.load(f)
+
+STOP_WORDS = {
+    'english': 'for a of the and to in',
+    'spanish': 'por para un una unos unas de del el la lo los las y a al en',
+}
+
+# Punctuation replaced by blanks, translation table built once
+PUNCTUATION = ",;:.-/\\(){}[]¿?¡!\"#&'+*%$_"
+NORMALIZE_TABLE = str.maketrans(PUNCTUATION, ' ' * len(PUNCTUATION))
+
+class TermNormalizer:
+    # Term pipeline of one language: a single stemmer, its stop list and a
+    # vocabulary-level cache of stems, shared by every document and query
+    def __init__(self, language):
+        self.language = language
+        self.stemmer = SnowballStemmer(language=language)
+        self.stop_list = set(STOP_WORDS.get(language, '').split())
+        self.stem_cache = {}
+
+    def stem(self, word):
+        stem = self.stem_cache.get(word)
+        if stem is None:
+            stem = self.stem_cache[word] = self.stemmer.stem(word)
+        return stem
+
+    def terms(self, text, stemming=True, normalize=False):
+        # One pass over the words: punctuation removal (if normalize), lowercase,
+        # stop-list filtering and cached stemming
+        if normalize:
+            text = text.translate(NORMALIZE_TABLE)
+        stop_list = self.stop_list
+        words = [word for word in text.lower().split() if word not in stop_list]
+        if not stemming:
+            return words
+        stem_cache = self.stem_cache
+        stems = []
+        for word in words:
+            stem = stem_cache.get(word)
+            if stem is None:
+                stem = stem_cache[word] = self.stemmer.stem(word)
+            stems.append(stem)
+        return stems
+
+TERM_NORMALIZERS = {}
+
+def get_term_normalizer(language=None):
+    # LANGUAGE may be changed from the command line after import, so normalizers are kept per language
+    if language is None:
+        language = LANGUAGE
+    normalizer = TERM_NORMALIZERS.get(language)
+    if normalizer is None:
+        normalizer = TERM_NORMALIZERS[language] = TermNormalizer(language)
+    return normalizer
 
+def apply_stemming(words):
     # stem's of each word
-    stem_words = []
-    for w in words:
-        x = snow_stemmer.stem(w)
-        stem_words.append(x)
+    normalizer = get_term_normalizer()
+    stem_words = [normalizer.stem(w) for w in words]
 
     # print stemming results
     #for e1, e2 in zip(words, stem_words):
@@ -65,53 +142,51 @@ def apply_stemming(words):
     return stem_words
 
 def get_stop_list():
-    global STOP_LIST
-    if STOP_LIST is not None:
-        return STOP_LIST
-    else:
-        if LANGUAGE == 'english':
-            STOP_LIST = set('for a of the and to in'.split(' '))
-        elif LANGUAGE == 'spanish':
-            STOP_LIST = set('por para un una unos unas de del el la lo los las y a al en'.split(' '))
-        return STOP_LIST
-
-def generate_terms(text, stemming=True):
-    stoplist = get_stop_list()
-
-    word_vector = [word for word in text.lower().split() if word not in stoplist]
-
-    if stemming:
-        #apply stemming
-        word_vector = apply_stemming(word_vector)
+    return get_term_normalizer().stop_list
 
-    return word_vector
+def generate_terms(text, stemming=True, normalize=False):
+    return get_term_normalizer().terms(text, stemming, normalize)
 
 def normalize(word):
-    x = ",;:.-/\\(){}[]¿?¡!\"#&'+*%$_"
-    y = "                          "
-    table = str.maketrans(x, y)
-    return word.translate(table).strip()
+    return word.translate(NORMALIZE_TABLE).strip()
 
-def process_text_file(foldername, filename):
+def read_text_file(foldername, filename):
     file_path = os.path.join(foldername, filename)
-    # print(file_path)
     with open(file_path) as fp:
-        text = ' '.join(normalize(line) for line in fp if line)
+        return fp.read()
+
+def process_text_file(foldername, filename):
+    # print(file_path)
+    text = ' '.join(normalize(read_text_file(foldername, filename)).split())
     # print(text)
     return text
 
+class TextTarget:
+    # Target for ET.XMLParser that keeps only the character data, in document order,
+    # which is what root.itertext() returns without building the tree first
+    def __init__(self):
+        self.chunks = []
 
-def process_xml_file(foldername, filename):
+    def data(self, data):
+        self.chunks.append(data)
+
+    def close(self):
+        return "".join(self.chunks)
+
+def read_xml_file(foldername, filename):
     file_path = os.path.join(foldername, filename)
     # print(file_path)
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-    raw_text = "".join(root.itertext())
+    parser = ET.XMLParser(target=TextTarget())
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            parser.feed(chunk)
+    return parser.close()
+
+def process_xml_file(foldername, filename):
+    raw_text = read_xml_file(foldername, filename)
     # print(raw_text)
-    # break into lines and remove leading and trailing space on each
-    lines = (line.strip() for line in raw_text.splitlines())
-    # remove punctuation
-    text = ' '.join(normalize(chunk) for line in lines for chunk in line.split())
+    # remove punctuation; splitting on blanks also breaks the lines and strips each chunk
+    text = ' '.join(normalize(raw_text).split())
     # print(text)
     return text
 
@@ -125,39 +200,102 @@ def store_filepahts(docs_folder, index_folder):
     with open(path_file_name, 'w') as f:
         json.dump(filepaths, f)
 
+def process_file(foldername, filename, language=None):
+    # punctuation removal is done inside the term pipeline, in the same pass as stemming
+    if filename.endswith('.xml'):
+        text = read_xml_file(foldername, filename)
+    else:
+        text = read_text_file(foldername, filename)
+    return get_term_normalizer(language).terms(text, normalize=True)
+
+def process_file_task(task):
+    return process_file(*task)
+
 class MyCorpus:
-    def __init__(self, folder_name):
+    # With workers > 1 the documents are processed in a pool of processes, chunksize
+    # files per task. imap keeps the sorted file order, so dictionary ids and paths.json stay aligned
+    def __init__(self, folder_name, workers=1, chunksize=16):
         self.folder_name = folder_name
+        self.workers = workers
+        self.chunksize = chunksize
 
     def __iter__(self):
-        for file in sorted(os.listdir(self.folder_name)):
-            # print(file)
-            if file.endswith('.xml'):
-                text = process_xml_file(self.folder_name, file)
-                yield generate_terms(text)
-            elif file.endswith('.txt'):
-                text = process_text_file(self.folder_name, file)
-                yield generate_terms(text)
+        files = [file for file in sorted(os.listdir(self.folder_name)) if file.endswith('.xml') or file.endswith('.txt')]
+        if self.workers > 1:
+            # the language is passed explicitly in case the workers do not inherit LANGUAGE
+            tasks = [(self.folder_name, file, LANGUAGE) for file in files]
+            with Pool(self.workers) as pool:
+                yield from pool.imap(process_file_task, tasks, chunksize=self.chunksize)
+        else:
+            for file in files:
+                # print(file)
+                yield process_file(self.folder_name, file)
 
 
 def create_dictionary(processed_corpus, compact=True):
     dictionary = corpora.Dictionary(processed_corpus)
 
     if compact:
-        # remove words that appear only once
-        once_ids = [tokenid for tokenid, docfreq in dictionary.dfs.items() if docfreq == 1]
-        dictionary.filter_tokens(once_ids)  # remove words that appear only once
-        dictionary.compactify()  # remove gaps in id sequence after words that were removed
+        compact_dictionary(dictionary)
 
     # print(dictionary)
     return dictionary
 
-def create_index(index_folder, docs_folder, model_type='tfidf'):
-    processed_corpus = MyCorpus(docs_folder)
+def compact_dictionary(dictionary):
+    # remove words that appear only once and return the mapping from old to new token ids
+    old_token2id = dict(dictionary.token2id)
+    once_ids = [tokenid for tokenid, docfreq in dictionary.dfs.items() if docfreq == 1]
+    dictionary.filter_tokens(once_ids)  # remove words that appear only once
+    dictionary.compactify()  # remove gaps in id sequence after words that were removed
+    return {old_token2id[token]: tokenid for token, tokenid in dictionary.token2id.items()}
+
+class RemappedCorpus:
+    # Streams a bag-of-words corpus translating the token ids with id_map and dropping the removed ones.
+    # compactify keeps the relative order of the ids, so every document stays sorted by id
+    def __init__(self, corpus, id_map):
+        self.corpus = corpus
+        self.id_map = id_map
+
+    def __iter__(self):
+        id_map = self.id_map
+        for document in self.corpus:
+            yield [(id_map[tokenid], count) for tokenid, count in document if tokenid in id_map]
+
+def build_streaming_corpus(processed_corpus, index_folder):
+    # Single pass over the documents: each one is parsed and stemmed once, the dictionary
+    # is updated and its bag of words is spilled to a MatrixMarket file on disk. After
+    # removing the words that appear only once, the ids are remapped into the final corpus
+    dictionary = corpora.Dictionary()
+    raw_file_name = get_corpus_file_name(index_folder) + '.raw'
+    raw_corpus = (dictionary.doc2bow(text, allow_update=True) for text in processed_corpus)
+    corpora.MmCorpus.serialize(raw_file_name, raw_corpus)
+
+    id_map = compact_dictionary(dictionary)
+
+    corpus_file_name = get_corpus_file_name(index_folder)
+    corpora.MmCorpus.serialize(corpus_file_name, RemappedCorpus(corpora.MmCorpus(raw_file_name), id_map))
+    os.remove(raw_file_name)
+    os.remove(raw_file_name + '.index')
+    return dictionary, corpora.MmCorpus(corpus_file_name)
+
+def create_sharded_index(corpus, num_features, index_folder, shard_size):
+    # Writes the term-document matrix as consecutive shards of shard_size documents. Each shard is a
+    # SparseMatrixSimilarity stored in separate .npy files, so only one shard is held in memory while
+    # indexing and the search memory-maps them
+    shard_sizes = []
+    for shard_no, chunk in enumerate(utils.grouper(corpus, shard_size)):
+        shard = similarities.SparseMatrixSimilarity(chunk, num_features=num_features)
+        shard.save(get_shard_file_name(index_folder, shard_no), separately=['index'])
+        shard_sizes.append(len(chunk))
+    return shard_sizes
+
+def create_index(index_folder, docs_folder, model_type='tfidf', shard_size=None, workers=1):
+    processed_corpus = MyCorpus(docs_folder, workers)
     # for vector in processed_corpus:  # load one vector into memory at a time
     #    print(vector)
 
-    dictionary = create_dictionary(processed_corpus)
+    # The documents are processed only once; the bag-of-words corpus is streamed from disk afterwards
+    dictionary, bow_corpus = build_streaming_corpus(processed_corpus, index_folder)
     length = len(dictionary.token2id)
     print('Dictionary length: ', length)
     pprint.pprint(dictionary.token2id)
@@ -173,7 +311,6 @@ def create_index(index_folder, docs_folder, model_type='tfidf'):
     new_vec = dictionary.doc2bow(new_doc_words)
     print('Example document as bow vector: ', new_vec)
 
-    bow_corpus = [dictionary.doc2bow(text) for text in processed_corpus]
     # pprint.pprint(bow_corpus)
 
     # train the model
@@ -195,19 +332,28 @@ def create_index(index_folder, docs_folder, model_type='tfidf'):
     print('Example document as tfidf vector ',model[new_vec])
 
     # We create and store the inverted index (term-document sparse matrix), which will be used later to compute the similarities with a query
-    # If the size of the corpus is big, the Similarity class should be used (see https://radimrehurek.com/gensim/similarities/docsim.html )
-    index = similarities.SparseMatrixSimilarity(model[bow_corpus], num_features=length)
-    index_file_name = get_index_file_name(index_folder)
-    index.save(index_file_name)
+    # If the size of the corpus is big, the index is split in shards of shard_size documents (see https://radimrehurek.com/gensim/similarities/docsim.html )
+    shard_sizes = None
+    if shard_size:
+        shard_sizes = create_sharded_index(model[bow_corpus], length, index_folder, shard_size)
+    else:
+        index = similarities.SparseMatrixSimilarity(model[bow_corpus], num_features=length)
+        index_file_name = get_index_file_name(index_folder)
+        # The term-document matrix is stored in separate .npy files so that it can be memory-mapped during search
+        index.save(index_file_name, separately=['index'])
 
     #We need to store also the file paths to show meaningful results during search
     store_filepahts(docs_folder, index_folder)
+    store_metadata(index_folder, model_type, length, len(bow_corpus), shard_sizes)
 
 
 if __name__ == '__main__':
 
     index_folder = '../gensimindex'
     docs_folder = '../docs'
+    model_type = 'tfidf'
+    shard_size = None
+    workers = 1
     i = 1
     while i < len(sys.argv):
         if sys.argv[i] == '-index':
@@ -220,6 +366,15 @@ if __name__ == '__main__':
             # -language is expected to be either 'english' or 'spanish'
             LANGUAGE = sys.argv[i + 1]
             i = i + 1
+        elif sys.argv[i] == '-model':
+            model_type = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-shardsize':
+            shard_size = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-workers':
+            workers = int(sys.argv[i + 1])
+            i = i + 1
         i = i + 1
 
-    create_index(index_folder, docs_folder)
\ No newline at end of file
+    create_index(index_folder, docs_folder, model_type, shard_size, workers)
\ No newline at end of file
@@ -11,37 +11,161 @@ Usage: python search.py -index <index folder> -language <english|spanish>
 from gensim import corpora
 from gensim import models
 from gensim import similarities
+from gensim import matutils
 
 from gensim_demo import index
 import sys
 import json
+import numpy as np
+from multiprocessing import Pool
 
-def search(index_folder, query):
-    dictionary = corpora.Dictionary.load(index.get_dictionary_file_name(index_folder))
+def top_k(sims, k=100, threshold=0.0, document_numbers=None):
+    # Returns the (document index, score) arrays of the k best scores above threshold.
+    # A partial selection finds the k-th best score in O(N) and only the k winners are sorted.
+    # If document_numbers is given, sims only holds the scores of those (sorted) documents
+    sims = np.asarray(sims)
+    candidates = np.flatnonzero(sims > threshold)
+    if k is not None and len(candidates) > k:
+        candidate_sims = sims[candidates]
+        kth = -np.partition(-candidate_sims, k - 1)[k - 1]
+        above = candidates[candidate_sims > kth]
+        # ties at the k-th score are resolved by document order
+        ties = candidates[candidate_sims == kth][:k - len(above)]
+        candidates = np.sort(np.concatenate([above, ties]))
+    # stable sort: ties keep the document order, as sorted(enumerate(sims)) did
+    order = candidates[np.argsort(-sims[candidates], kind='stable')]
+    if document_numbers is not None:
+        return np.asarray(document_numbers)[order], sims[order]
+    return order, sims[order]
 
-    query_document = index.generate_terms(query)
+def score_shard(matrix, query_matrix, k=100, threshold=0.0, offset=0):
+    # Scores a term-query matrix against one term-document matrix with a sparse-sparse
+    # product and returns the top k (document number, score) arrays of every query
+    sims = (matrix @ query_matrix).tocsc()  # N x T * T x C = N x C
+    sims.sort_indices()
+    results = []
+    for j in range(sims.shape[1]):
+        if threshold < 0:
+            # documents without common terms score 0 and are not stored in the sparse result
+            document_numbers, scores = top_k(sims[:, j].toarray().ravel(), k, threshold)
+        else:
+            begin, end = sims.indptr[j], sims.indptr[j + 1]
+            document_numbers, scores = top_k(sims.data[begin:end], k, threshold, sims.indices[begin:end])
+        results.append((document_numbers + offset, scores))
+    return results
+
+def merge_top_k(current, new, k=100, threshold=0.0):
+    # Merges two partial top k results of the same query, keeping document order on ties
+    document_numbers = np.concatenate([current[0], new[0]])
+    scores = np.concatenate([current[1], new[1]])
+    order = np.argsort(document_numbers, kind='stable')
+    return top_k(scores[order], k, threshold, document_numbers[order])
+
+# Shards memory-mapped by each worker process of the pool
+WORKER_SHARDS = None
+
+def init_shard_worker(shard_file_names):
+    global WORKER_SHARDS
+    WORKER_SHARDS = [similarities.SparseMatrixSimilarity.load(name, mmap='r') for name in shard_file_names]
+
+def score_shard_worker(args):
+    shard_no, query_matrix, k, threshold, offset = args
+    return score_shard(WORKER_SHARDS[shard_no].index, query_matrix, k, threshold, offset)
+
+class GensimSearcher:
+    # Loads the dictionary, model, index and file paths once to serve many queries.
+    # With mmap='r' the term-document matrix is memory-mapped, so several worker
+    # processes share a single copy of it through the page cache.
+    # A sharded index is scored shard by shard (in a pool of workers processes if
+    # workers > 1) merging the top k of every shard as they arrive.
+    def __init__(self, index_folder, mmap='r', workers=1):
+        metadata = index.load_metadata(index_folder)
+        self.model_type = metadata['model_type']
+        # Queries go through the term pipeline of the language the index was built with;
+        # indexes without it in their metadata use LANGUAGE (the -language option)
+        self.normalizer = index.get_term_normalizer(metadata.get('language'))
+        self.dictionary = corpora.Dictionary.load(index.get_dictionary_file_name(index_folder))
+        if self.model_type == 'okapi':
+            self.model = models.OkapiBM25Model.load(index.get_model_file_name(index_folder), mmap=mmap)
+            # BM25 weights are applied to the documents only; queries are binary bag of words
+            self.query_model = models.TfidfModel(dictionary=self.dictionary, smartirs='bnn')
+        else:
+            self.model = models.TfidfModel.load(index.get_model_file_name(index_folder), mmap=mmap)
+            self.query_model = self.model
+        if 'shards' in metadata:
+            shard_file_names = [index.get_shard_file_name(index_folder, shard_no) for shard_no in range(len(metadata['shards']))]
+            self.offsets = np.cumsum([0] + metadata['shards'][:-1])
+        else:
+            shard_file_names = [index.get_index_file_name(index_folder)]
+            self.offsets = [0]
+        self.shards = [similarities.SparseMatrixSimilarity.load(name, mmap=mmap) for name in shard_file_names]
+        self.pool = None
+        if workers > 1 and len(self.shards) > 1:
+            self.pool = Pool(workers, initializer=init_shard_worker, initargs=(shard_file_names,))
+        # Load the file_paths to display meaningful results
+        with open(index.get_paths_file_name(index_folder), 'r') as f:
+            self.file_paths = json.load(f)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def query_vector(self, query):
+        query_document = self.normalizer.terms(query)
+        query_bow = self.dictionary.doc2bow(query_document)
+        return self.query_model[query_bow]
+
+    def search(self, query, k=100, threshold=0.0):
+        # Returns a list of (file path, score) pairs sorted by decreasing score
+        return self.search_batch([query], k, threshold)[0]
+
+    def search_batch(self, queries, k=100, threshold=0.0, chunksize=256):
+        # All the queries are turned into one sparse term-query matrix and scored
+        # against the term-document matrix with a sparse-sparse product, chunksize
+        # queries at a time to bound the memory of the result
+        vectors = [self.query_vector(query) for query in queries]
+        if self.shards[0].normalize:
+            vectors = [matutils.unitvec(vector) for vector in vectors]
+        num_terms, dtype = self.shards[0].index.shape[1], self.shards[0].index.dtype
+        query_matrix = matutils.corpus2csc(vectors, num_terms=num_terms, num_docs=len(vectors), dtype=dtype)
+        results = []
+        for start in range(0, len(vectors), chunksize):
+            chunk = query_matrix[:, start:start + chunksize]
+            if self.pool is not None:
+                tasks = [(shard_no, chunk, k, threshold, offset) for shard_no, offset in enumerate(self.offsets)]
+                shard_results = self.pool.imap(score_shard_worker, tasks)
+            else:
+                shard_results = (score_shard(shard.index, chunk, k, threshold, offset)
+                                 for shard, offset in zip(self.shards, self.offsets))
+            merged = None
+            for shard_result in shard_results:
+                if merged is None:
+                    merged = shard_result
+                else:
+                    merged = [merge_top_k(current, new, k, threshold) for current, new in zip(merged, shard_result)]
+            for document_numbers, scores in merged:
+                results.append([(self.file_paths[d], float(s)) for d, s in zip(document_numbers, scores)])
+        return results
+
+def search(index_folder, query, k=100, threshold=0.0, searcher=None):
+    if searcher is None:
+        searcher = GensimSearcher(index_folder)
+
+    query_document = searcher.normalizer.terms(query)
     print('query words: ', query_document)
-    query_bow = dictionary.doc2bow(query_document)
+    query_bow = searcher.dictionary.doc2bow(query_document)
     print('query bow: ', query_bow)
 
-    index_matrix = similarities.MatrixSimilarity.load(index.get_index_file_name(index_folder))
-    model = models.TfidfModel.load(index.get_model_file_name(index_folder))
-
-    print('query tfidf vector: ',model[query_bow])
-    sims = index_matrix[model[query_bow]]
+    print(f'query {searcher.model_type} vector: ', searcher.query_model[query_bow])
 
     print('Returned documents:')
 
-    # Load the file_paths to display meaningful results
-    with open(index.get_paths_file_name(index_folder), 'r') as f:
-        file_paths = json.load(f)
-
-    i = 1
-    for document_number, score in sorted(enumerate(sims), key=lambda x: x[1], reverse=True):
-        if score == 0.0 or i > 100:
-            break
-        print(f'{i} - File path: {file_paths[document_number]}, Similarity score: {score}')
-        i += 1
+    results = searcher.search(query, k, threshold)
+    for i, (file_path, score) in enumerate(results, start=1):
+        print(f'{i} - File path: {file_path}, Similarity score: {score}')
+    return results
 
 if __name__ == '__main__':
     index_folder = '../gensimindex'
@@ -51,11 +175,16 @@ if __name__ == '__main__':
             index_folder = sys.argv[i+1]
             i = i + 1
         elif sys.argv[i] == '-language':
-            # -language is expected to be either 'english' or 'spanish'
+            # -language is expected to be either 'english' or 'spanish'; it is only used
+            # for indexes whose metadata does not record their language
             index.LANGUAGE = sys.argv[i + 1]
             i = i + 1
         i = i + 1
 
+    searcher = GensimSearcher(index_folder)
+
     #query = 'system engineering'
     query = input('Introduce a query: ')
-    search(index_folder, query)
\ No newline at end of file
+    while query != 'q':
+        search(index_folder, query, searcher=searcher)
+        query = input('Introduce a query (\'q\' for exit): ')
\ No newline at end of file
@@ -5,19 +5,197 @@ Last update: 2025-09-28
 
 Language analyzer para la práctica 1 de Recuperación de Información usando
 librerías Whoosh.
+
+CustomAnalyzer encadena RegexTokenizer | LowercaseFilter | StopFilter | SnowballStemFilter.
+BatchAnalyzer produce los mismos términos tratando el valor del campo de una vez: pasa a minúsculas
+el texto completo, lo tokeniza con una sola expresión regular precompilada, filtra las palabras
+vacías con un frozenset y calcula la raíz de cada palabra distinta una sola vez.
 """
 
-from whoosh.analysis import RegexTokenizer, LowercaseFilter, StopFilter, Filter
-from nltk.stem.snowball import SnowballStemmer
+from whoosh.analysis import RegexTokenizer, LowercaseFilter, StopFilter, Filter, Analyzer, Token
+from whoosh.lang import stopwords_for_language
+from collections import OrderedDict
+
+import json
+import os
+import re
+
+STEM_CACHE_FILE = 'stem_cache.json'
+DEFAULT_CACHE_SIZE = 50000
+# Expresión por defecto de RegexTokenizer, sin grupos para poder usar findall
+TOKEN_PATTERN = r"\w+(?:\.?\w+)*"
 
 class SnowballStemFilter(Filter):
-    def __init__(self):
-        self.stemmer = SnowballStemmer(language="spanish")
+    # Las palabras comunes se repiten miles de veces, así que se guarda en una
+    # caché LRU acotada el resultado de SnowballStemmer.stem para cada palabra.
+    # Importar nltk cuesta más de un segundo (arrastra scipy), así que el stemmer
+    # se crea en el primer fallo de la caché: una búsqueda cuyas palabras están en
+    # la caché guardada con el índice no llega a importarlo.
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.stemmer = None
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Ni la caché ni el stemmer forman parte del esquema que whoosh guarda en el TOC;
+    # así, abrir el índice no importa nltk
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['stemmer'] = None
+        state['cache'] = OrderedDict()
+        state['hits'] = 0
+        state['misses'] = 0
+        return state
+
+    # whoosh reconstruye el esquema sin llamar a __init__, y los índices anteriores a la
+    # caché solo guardan {'stemmer'}: se parte de los valores por defecto
+    def __setstate__(self, state):
+        self.stemmer = None
+        self.cache_size = DEFAULT_CACHE_SIZE
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.__dict__.update(state)
+
+    def __eq__(self, other):
+        return other.__class__ is self.__class__ and self.cache_size == other.cache_size
+
+    def __hash__(self):
+        return hash((self.__class__, self.cache_size))
+
+    def get_stemmer(self):
+        if self.stemmer is None:
+            from nltk.stem.snowball import SnowballStemmer
+            self.stemmer = SnowballStemmer(language="spanish")
+        return self.stemmer
 
     def __call__(self, tokens):
+        cache = self.cache
         for t in tokens:
-            t.text = self.stemmer.stem(t.text)
+            word = t.text
+            stem = cache.get(word)
+            if stem is None:
+                self.misses += 1
+                stem = self.get_stemmer().stem(word)
+                cache[word] = stem
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+            else:
+                self.hits += 1
+                cache.move_to_end(word)
+            t.text = stem
+            yield t
+
+    # Raíz de cada palabra de un conjunto de palabras distintas, con la misma caché
+    def stems(self, words):
+        cache = self.cache
+        stems = {}
+        for word in words:
+            stem = cache.get(word)
+            if stem is None:
+                self.misses += 1
+                stem = self.get_stemmer().stem(word)
+                cache[word] = stem
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+            else:
+                self.hits += 1
+                cache.move_to_end(word)
+            stems[word] = stem
+        return stems
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def load_cache(self, folder):
+        cache_path = os.path.join(folder, STEM_CACHE_FILE)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            # Se conservan las más recientes si el fichero es mayor que la caché
+            for word, stem in entries[-self.cache_size:]:
+                self.cache[word] = stem
+
+    def save_cache(self, folder):
+        cache_path = os.path.join(folder, STEM_CACHE_FILE)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.cache.items()), f, ensure_ascii=False)
+
+class BatchAnalyzer(Analyzer):
+    # Mismos tokens (texto, posición, offsets y stopped) que la cadena de CustomAnalyzer,
+    # incluida la renumeración de posiciones de StopFilter, sin un generador por filtro
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, minsize=2):
+        self.expression = re.compile(TOKEN_PATTERN, re.UNICODE)
+        self.stops = frozenset(stopwords_for_language("es"))
+        self.min = minsize
+        self.stem_filter = SnowballStemFilter(cache_size)
+
+    def __call__(self, value, positions=False, chars=False, keeporiginal=False, removestops=True,
+                 start_pos=0, start_char=0, tokenize=True, mode='', no_morph=False, **kwargs):
+        lowered = value.lower()
+        spans = None
+        if not tokenize:
+            words = [lowered]
+            spans = [(0, len(value))]
+        elif len(lowered) != len(value):
+            # lower() ha cambiado la longitud (p. ej. 'İ'): se tokeniza el original para
+            # que los offsets coincidan y se pasa cada token a minúsculas
+            matches = list(self.expression.finditer(value))
+            words = [match.group().lower() for match in matches]
+            spans = [match.span() for match in matches]
+        elif chars or keeporiginal:
+            matches = list(self.expression.finditer(lowered))
+            words = [match.group() for match in matches]
+            spans = [match.span() for match in matches]
+        else:
+            words = self.expression.findall(lowered)
+
+        stops = self.stops
+        minsize = self.min
+        if removestops:
+            stems = self.stem_filter.stems({word for word in words if len(word) >= minsize and word not in stops})
+        else:
+            stems = self.stem_filter.stems(set(words))
+
+        t = Token(positions, chars, removestops=removestops, mode=mode, **kwargs)
+        if not tokenize:
+            # RegexTokenizer guarda siempre el original cuando no tokeniza
+            t.original = value
+        pos = None
+        for i, word in enumerate(words):
+            if len(word) >= minsize and word not in stops:
+                stopped = False
+                if positions:
+                    pos = start_pos + i if pos is None else pos + 1
+            elif removestops:
+                continue
+            else:
+                stopped = True
+            t.text = stems[word]
+            t.boost = 1.0
+            t.stopped = stopped
+            if keeporiginal:
+                start, end = spans[i]
+                t.original = value[start:end]
+            if positions:
+                t.pos = start_pos + i if stopped else pos
+            if chars:
+                start, end = spans[i]
+                t.startchar = start_char + start
+                t.endchar = start_char + end
             yield t
 
-def CustomAnalyzer():
-    return RegexTokenizer() | LowercaseFilter() | StopFilter(lang="es") | SnowballStemFilter()
\ No newline at end of file
+def CustomAnalyzer(cache_size=DEFAULT_CACHE_SIZE, batch=False):
+    if batch:
+        return BatchAnalyzer(cache_size)
+    return RegexTokenizer() | LowercaseFilter() | StopFilter(lang="es") | SnowballStemFilter(cache_size)
+
+def get_stem_filter(analyzer):
+    if isinstance(analyzer, BatchAnalyzer):
+        return analyzer.stem_filter
+    for item in getattr(analyzer, 'items', []):
+        if isinstance(item, SnowballStemFilter):
+            return item
+    return None
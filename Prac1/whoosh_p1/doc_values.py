@@ -0,0 +1,144 @@
+"""
+doc_values.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Columnas de valores por documento (doc values) indexadas por el docnum de whoosh, para leer el
+path y los campos numéricos (las coordenadas en la práctica 2) de una página de resultados sin
+decodificar los campos almacenados de cada documento.
+
+Se escriben al terminar la indexación, junto al índice y con su identidad en el nombre:
+  docvalues_<id>.json        -> identidad, número de documentos, columnas y orden de bytes
+  docvalues_<id>_<campo>.f64 -> un float64 por docnum (NaN si el documento no tiene valor)
+  docvalues_<id>_path.off    -> int64 con el inicio de cada path; el último es el final
+  docvalues_<id>_path.str    -> los paths en UTF-8 uno detrás de otro
+La identidad (index_identity) es la generación del TOC más un resumen de los ids de sus segmentos:
+una reconstrucción completa con create_in vuelve a la generación 1, pero sus segmentos son nuevos.
+Cada fichero se escribe aparte y se renombra con os.replace, así que un searcher que aún tiene
+mapeadas las columnas anteriores las sigue leyendo enteras y coherentes con su lector.
+Los ficheros se abren con mmap y se leen con memoryview, sin copiarlos a memoria ni importar numpy.
+Si la identidad no coincide con la del searcher (el índice ha cambiado sin reconstruirlas),
+load_doc_values devuelve None y se vuelve a los campos almacenados.
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+
+import whoosh.index as index
+
+DOC_VALUES_PREFIX = 'docvalues_'
+PATH_FIELD = 'path'
+
+def index_identity(reader):
+    # Los ids de segmento son aleatorios, cambian con cada commit y fijan el orden de los docnum
+    segments = [leaf.segment().segment_id() for leaf, _ in reader.leaf_readers() if hasattr(leaf, 'segment')]
+    return f"{reader.generation()}-{hashlib.sha1(' '.join(segments).encode('utf-8')).hexdigest()[:16]}"
+
+def doc_values_file(index_folder, identity, suffix):
+    return os.path.join(index_folder, f"{DOC_VALUES_PREFIX}{identity}{suffix}")
+
+def write_replace(file_path, data):
+    with open(file_path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(file_path + '.tmp', file_path)
+
+def build_doc_values(index_folder, numeric_fields=()):
+    # Igual que build_spatial_index, recorre los campos almacenados del índice ya
+    # confirmado. Los documentos borrados se quedan sin valores
+    ix = index.open_dir(index_folder)
+    with ix.reader() as reader:
+        identity = index_identity(reader)
+        doc_count = reader.doc_count_all()
+        columns = {name: array('d', [math.nan]) * doc_count for name in numeric_fields}
+        paths = [None] * doc_count
+        for docnum, fields in reader.iter_docs():
+            paths[docnum] = fields.get(PATH_FIELD)
+            for name, column in columns.items():
+                value = fields.get(name)
+                if value is not None:
+                    column[docnum] = value
+
+    offsets = array('q', [0])
+    strings = bytearray()
+    for path in paths:
+        if path:
+            strings += path.encode('utf-8')
+        offsets.append(len(strings))
+
+    for name, column in columns.items():
+        write_replace(doc_values_file(index_folder, identity, f"_{name}.f64"), column.tobytes())
+    write_replace(doc_values_file(index_folder, identity, "_path.off"), offsets.tobytes())
+    write_replace(doc_values_file(index_folder, identity, "_path.str"), bytes(strings))
+    # El JSON se escribe el último: si existe, las columnas están completas
+    meta = {"identity": identity, "doc_count": doc_count, "columns": list(columns), "byteorder": sys.byteorder}
+    write_replace(doc_values_file(index_folder, identity, ".json"), json.dumps(meta).encode('utf-8'))
+    remove_old_doc_values(index_folder, identity)
+    return identity
+
+def remove_old_doc_values(index_folder, identity):
+    current = f"{DOC_VALUES_PREFIX}{identity}"
+    for name in os.listdir(index_folder):
+        if name.startswith(DOC_VALUES_PREFIX) and not (name.startswith(current + "_") or name.startswith(current + ".")):
+            try:
+                os.remove(os.path.join(index_folder, name))
+            except OSError:
+                # En Windows no se puede borrar mientras otro searcher lo tiene mapeado
+                pass
+
+class DocValues:
+    def __init__(self, index_folder, meta):
+        identity = meta["identity"]
+        self.identity = identity
+        self.doc_count = meta["doc_count"]
+        self.maps = []
+        self.columns = {name: self.map(doc_values_file(index_folder, identity, f"_{name}.f64"), 'd')
+                        for name in meta["columns"]}
+        self.offsets = self.map(doc_values_file(index_folder, identity, "_path.off"), 'q')
+        strings_path = doc_values_file(index_folder, identity, "_path.str")
+        # mmap no admite ficheros vacíos (ningún documento con path)
+        self.strings = self.map(strings_path, 'B') if os.path.getsize(strings_path) else b""
+
+    def map(self, file_path, typecode):
+        with open(file_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+    def path(self, docnum):
+        start, end = self.offsets[docnum], self.offsets[docnum + 1]
+        return bytes(self.strings[start:end]).decode('utf-8') if end > start else None
+
+    def value(self, name, docnum):
+        value = self.columns[name][docnum]
+        return None if value != value else value
+
+    # Una tupla con los campos names de cada docnum, como los daría stored_fields
+    def rows(self, docnums, names):
+        getters = [self.path if name == PATH_FIELD else (lambda docnum, name=name: self.value(name, docnum))
+                   for name in names]
+        return [tuple(getter(docnum) for getter in getters) for docnum in docnums]
+
+    def close(self):
+        # Las memoryview se liberan antes de cerrar los mmap a los que apuntan
+        for view in list(self.columns.values()) + [self.offsets, self.strings]:
+            if isinstance(view, memoryview):
+                view.release()
+        for mapped in self.maps:
+            mapped.close()
+        self.maps = []
+
+def load_doc_values(index_folder, identity):
+    meta_path = doc_values_file(index_folder, identity, ".json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    # Las columnas se escriben con el orden de bytes de la máquina que indexa
+    if meta.get("identity") != identity or meta["byteorder"] != sys.byteorder or meta["doc_count"] == 0:
+        return None
+    return DocValues(index_folder, meta)
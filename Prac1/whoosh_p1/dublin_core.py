@@ -0,0 +1,85 @@
+"""
+dublin_core.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Extracción en una sola pasada de los campos Dublin Core (dc:identifier, creator, contributor,
+publisher, title, description, subject, date) y de las esquinas ows:LowerCorner/UpperCorner.
+El fichero se lee por bloques y se pasa a un XMLParser de ElementTree con un target propio que
+recibe los eventos de expat (start, data, end): no se construye ningún árbol, así que la memoria
+no depende del tamaño del fichero. Cada elemento oai_dc:dc es un registro, de modo que un volcado
+con muchos registros se procesa sin cargarlo entero; un fichero sin oai_dc:dc es un único registro.
+"""
+
+import xml.etree.ElementTree as ET
+
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+OWS_NS = 'http://www.opengis.net/ows'
+RECORD_TAG = '{http://www.openarchives.org/OAI/2.0/oai_dc/}dc'
+FIELD_TAGS = {f'{{{DC_NS}}}{name}': name for name in
+              ('identifier', 'creator', 'contributor', 'publisher', 'title', 'description', 'subject', 'date')}
+FIELD_TAGS.update({f'{{{OWS_NS}}}{name}': name for name in ('LowerCorner', 'UpperCorner')})
+CHUNK_SIZE = 1 << 16
+
+class DublinCoreTarget:
+    # Cada registro es un diccionario campo -> lista de textos en orden del documento.
+    # El texto de un campo es el de element.text: hasta el primer hijo, None si está vacío
+    def __init__(self):
+        self.records = []
+        self.record = {}
+        self.field = None
+        self.field_depth = 0
+        self.in_text = False
+        self.buffer = []
+
+    def start(self, tag, attrib):
+        if self.field is not None:
+            # A partir del primer hijo ya no es parte de element.text
+            self.field_depth += 1
+            self.in_text = False
+            return
+        name = FIELD_TAGS.get(tag)
+        if name is not None:
+            self.field = name
+            self.field_depth = 0
+            self.in_text = True
+            self.buffer = []
+
+    def data(self, data):
+        if self.in_text:
+            self.buffer.append(data)
+
+    def end(self, tag):
+        if self.field is not None:
+            if self.field_depth > 0:
+                self.field_depth -= 1
+                return
+            self.record.setdefault(self.field, []).append(''.join(self.buffer) or None)
+            self.field = None
+            self.in_text = False
+        if tag == RECORD_TAG:
+            self.records.append(self.record)
+            self.record = {}
+
+    def close(self):
+        if self.record:
+            self.records.append(self.record)
+            self.record = {}
+
+    def drain(self):
+        records, self.records = self.records, []
+        return records
+
+def iter_records(file_path):
+    target = DublinCoreTarget()
+    parser = ET.XMLParser(target=target)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            parser.feed(chunk)
+            yield from target.drain()
+    parser.close()
+    yield from target.drain()
+
+def first(record, name):
+    values = record.get(name)
+    return values[0] if values else None
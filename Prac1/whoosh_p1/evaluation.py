@@ -0,0 +1,207 @@
+"""
+evaluation.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Evaluación de los resultados de search.py frente a juicios de relevancia (qrels).
+Los qrels se cargan una sola vez en un diccionario (consulta, documento) -> relevancia. Cada
+ejecución se convierte en una matriz consultas x posiciones con la relevancia de cada resultado,
+y todas las métricas se calculan con numpy sobre esa matriz a la vez para todas las consultas:
+P@k, R-precision, MAP, nDCG@k y la precisión interpolada en los 11 niveles de recall estándar.
+
+Formatos de resultados admitidos (se detectan línea a línea):
+  "query_num\\tdoc_id"                        -> un resultado por línea
+  "query_num\\tnum_docs\\tids\\tscores"          -> línea de las consultas espaciales de la práctica 2
+  {"q": query_num, "ids": [...], ...}          -> salida -format jsonl
+Formatos de qrels: "query_num doc_id relevance" o el de TREC "query_num 0 doc_id relevance".
+Los identificadores "N-url" de la práctica 2 se reducen a su número N (como en la salida espacial),
+tanto en los resultados como en los qrels; el resto de identificadores se comparan enteros, aunque
+contengan '-'.
+
+Usage: python evaluation.py -qrels <qrelsFile> -results <resultFile> [-k <5,10,...>] [-perQuery]
+"""
+
+import json
+import re
+import sys
+
+import numpy as np
+
+DEFAULT_K = (5, 10, 20)
+RECALL_LEVELS = np.linspace(0.0, 1.0, 11)
+SPATIAL_DOC_ID = re.compile(r"^(\d+)-")
+
+def normalize_doc_id(doc_id):
+    doc_id = doc_id.strip()
+    match = SPATIAL_DOC_ID.match(doc_id)
+    return match.group(1) if match else doc_id
+
+class Qrels:
+    def __init__(self, judgments):
+        # judgments: {query_num: {doc_id: relevancia}}; solo cuentan relevancias > 0
+        self.judgments = {}
+        self.relevance = {}
+        for query_num, docs in judgments.items():
+            relevant = {normalize_doc_id(doc_id): rel for doc_id, rel in docs.items() if rel > 0}
+            self.judgments[str(query_num)] = relevant
+            for doc_id, rel in relevant.items():
+                self.relevance[(str(query_num), doc_id)] = rel
+        self.query_nums = sorted(self.judgments, key=query_sort_key)
+
+    @classmethod
+    def load(cls, qrels_file):
+        judgments = {}
+        with open(qrels_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3:
+                    query_num, doc_id, rel = fields
+                elif len(fields) == 4:
+                    query_num, _, doc_id, rel = fields
+                else:
+                    continue
+                judgments.setdefault(query_num, {})[doc_id] = int(rel)
+        return cls(judgments)
+
+    def num_relevant(self, query_nums):
+        return np.array([len(self.judgments.get(q, ())) for q in query_nums], dtype=np.float64)
+
+    # Relevancias de cada resultado, en una matriz (consultas, depth) rellena con ceros
+    def gain_matrix(self, query_nums, run, depth):
+        gains = np.zeros((len(query_nums), depth), dtype=np.float64)
+        relevance = self.relevance
+        for row, query_num in enumerate(query_nums):
+            docs = run.get(query_num, ())[:depth]
+            gains[row, :len(docs)] = [relevance.get((query_num, doc_id), 0) for doc_id in docs]
+        return gains
+
+    # Relevancias de los documentos relevantes en orden descendente: la ordenación ideal
+    def ideal_matrix(self, query_nums, depth):
+        ideal = np.zeros((len(query_nums), depth), dtype=np.float64)
+        for row, query_num in enumerate(query_nums):
+            rels = sorted(self.judgments.get(query_num, {}).values(), reverse=True)[:depth]
+            ideal[row, :len(rels)] = rels
+        return ideal
+
+def query_sort_key(query_num):
+    return (0, int(query_num), '') if query_num.isdigit() else (1, 0, query_num)
+
+def normalize_run(run):
+    # Admite listas de doc_id o de (doc_id, score), como las de MySearcher.query_results
+    normalized = {}
+    for query_num, docs in run.items():
+        normalized[str(query_num)] = [normalize_doc_id(doc if isinstance(doc, str) else doc[0]) for doc in docs]
+    return normalized
+
+def load_run(result_file):
+    run = {}
+    with open(result_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                run.setdefault(str(record["q"]), []).extend(record["ids"])
+                continue
+            fields = line.split("\t")
+            if len(fields) == 4:
+                # Consulta espacial: los identificadores van separados por comas
+                run.setdefault(fields[0], []).extend(doc_id for doc_id in fields[2].split(",") if doc_id)
+            elif len(fields) >= 2:
+                run.setdefault(fields[0], []).append(fields[1])
+    return normalize_run(run)
+
+def evaluate(qrels, run, k_values=DEFAULT_K, per_query=False):
+    # Evalúa sobre las consultas de los qrels; las que no aparecen en la ejecución
+    # puntúan 0. run puede venir de load_run o ser un diccionario en memoria.
+    run = normalize_run(run)
+    query_nums = qrels.query_nums
+    max_k = max(k_values) if k_values else 1
+    depth = max([max_k] + [len(docs) for docs in run.values()])
+    gains = qrels.gain_matrix(query_nums, run, depth)
+    num_relevant = qrels.num_relevant(query_nums)
+    safe_relevant = np.maximum(num_relevant, 1)
+    positions = np.arange(1, depth + 1, dtype=np.float64)
+
+    relevant = gains > 0
+    hits = np.cumsum(relevant, axis=1)
+    precision = hits / positions
+    recall = hits / safe_relevant[:, None]
+
+    metrics = {}
+    for k in k_values:
+        metrics[f"P@{k}"] = hits[:, k - 1] / k
+
+    # R-precision: precisión en la posición R (número de relevantes de la consulta)
+    r_index = np.clip(num_relevant.astype(np.int64), 1, depth) - 1
+    metrics["Rprec"] = hits[np.arange(len(query_nums)), r_index] / safe_relevant
+
+    metrics["AP"] = (precision * relevant).sum(axis=1) / safe_relevant
+
+    # La ordenación ideal llega hasta el último relevante aunque la ejecución sea más corta
+    ideal_depth = max(depth, int(num_relevant.max()) if len(query_nums) else 0)
+    discounts = 1.0 / np.log2(np.arange(2, ideal_depth + 2, dtype=np.float64))
+    dcg = np.cumsum(gains * discounts[:depth], axis=1)
+    idcg = np.cumsum(qrels.ideal_matrix(query_nums, ideal_depth) * discounts, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in k_values:
+            metrics[f"nDCG@{k}"] = np.where(idcg[:, k - 1] > 0, dcg[:, k - 1] / idcg[:, k - 1], 0.0)
+        metrics["nDCG"] = np.where(idcg[:, -1] > 0, dcg[:, -1] / idcg[:, -1], 0.0)
+
+    # Precisión interpolada: máximo de la precisión en las posiciones con recall >= nivel
+    best_precision = np.maximum.accumulate(precision[:, ::-1], axis=1)[:, ::-1]
+    # Margen para que, p. ej., un recall de 3/10 alcance el nivel 0.30000000000000004
+    reached = recall[:, :, None] >= RECALL_LEVELS[None, None, :] - 1e-9
+    first = reached.argmax(axis=1)
+    interpolated = np.where(reached.any(axis=1),
+                            np.take_along_axis(best_precision, first, axis=1), 0.0)
+
+    summary = {name: float(values.mean()) if len(values) else 0.0 for name, values in metrics.items()}
+    summary["MAP"] = summary.pop("AP")
+    summary["iprec_at_recall"] = [float(p) for p in interpolated.mean(axis=0)] if len(query_nums) else [0.0] * 11
+    summary["num_queries"] = len(query_nums)
+    if per_query:
+        summary["per_query"] = {query_num: {name: float(values[row]) for name, values in metrics.items()}
+                                for row, query_num in enumerate(query_nums)}
+    return summary
+
+def print_summary(summary):
+    for name, value in summary.items():
+        if name == "iprec_at_recall":
+            for level, precision in zip(RECALL_LEVELS, value):
+                print(f"iprec_at_recall_{level:.1f}\t{precision:.4f}")
+        elif name == "per_query":
+            for query_num, metrics in value.items():
+                print(query_num + "\t" + "\t".join(f"{metric}={v:.4f}" for metric, v in metrics.items()))
+        elif isinstance(value, float):
+            print(f"{name}\t{value:.4f}")
+        else:
+            print(f"{name}\t{value}")
+
+
+if __name__ == '__main__':
+    qrels_PATH = None
+    result_PATH = '../result.txt'
+    k_values = DEFAULT_K
+    per_query = False
+    i = 1
+    while (i < len(sys.argv)):
+        if sys.argv[i] == '-qrels':
+            qrels_PATH = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-results':
+            result_PATH = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-k':
+            k_values = tuple(int(k) for k in sys.argv[i+1].split(","))
+            i = i + 1
+        elif sys.argv[i] == '-perQuery':
+            per_query = True
+        i = i + 1
+
+    if qrels_PATH is None:
+        print("Usage: python evaluation.py -qrels <qrelsFile> -results <resultFile> [-k <5,10,...>] [-perQuery]")
+        sys.exit(1)
+
+    print_summary(evaluate(Qrels.load(qrels_PATH), load_run(result_PATH), k_values, per_query))
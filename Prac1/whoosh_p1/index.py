@@ -3,91 +3,204 @@ index.py
 Author: Jorge Pagan Saiz and Jiahao Ye
 Last update: 2025-09-27
 
-Usage: python index.py -docs <docsPath> -index <indexPath>
+Usage: python index.py -docs <docsPath> -index <indexPath> [-incremental] [-batchAnalyzer]
+                       [-segmentsPerTier <N>] [-maxDeleted <ratio>]
+
+Con -incremental se reutiliza el índice existente: un manifiesto con la ruta, mtime, tamaño
+y hash de cada fichero permite añadir los nuevos, actualizar los modificados y borrar los
+eliminados sin reconstruir el índice completo.
+
+Los XML se leen en streaming con dublin_core.iter_records. Un fichero puede ser un documento o un
+volcado con varios registros oai_dc:dc; cada registro con dc:identifier se indexa como un documento.
 """
 
-from whoosh.index import create_in
-from whoosh.fields import *
-from whoosh.analysis import LanguageAnalyzer
+from whoosh.index import create_in, open_dir, exists_in
+from whoosh.fields import Schema, ID, TEXT, NUMERIC
 from datetime import datetime
 
-from analyzer import CustomAnalyzer
+from analyzer import CustomAnalyzer, get_stem_filter
+from maintenance import TieredMergePolicy
+from doc_values import build_doc_values
+from dublin_core import iter_records, first
 
 import os
+import sys
+import json
+import hashlib
 
-import xml.etree.ElementTree as ET
+MANIFEST_FILE = 'manifest.json'
 
 def create_folder(folder_name):
     if (not os.path.exists(folder_name)):
         os.mkdir(folder_name)
 
+def file_hash(file_path):
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# Identificadores indexados desde un fichero. Los manifiestos anteriores a los
+# volcados con varios registros guardan uno solo en 'id'
+def entry_ids(entry):
+    return entry['ids'] if 'ids' in entry else [entry['id']]
+
+def load_manifest(index_folder):
+    manifest_path = os.path.join(index_folder, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+# Los índices creados antes de -incremental no tienen manifiesto ni path único: update_document
+# añadiría cada documento otra vez en lugar de sustituirlo
+def supports_incremental(index, index_folder):
+    return index.schema['path'].unique and os.path.exists(os.path.join(index_folder, MANIFEST_FILE))
+
+def save_manifest(index_folder, manifest):
+    manifest_path = os.path.join(index_folder, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
 class MyIndex:
-    def __init__(self,index_folder):
-        language_analyzer = CustomAnalyzer()
-        schema = Schema(path=ID(stored=True), autor=TEXT(analyzer=language_analyzer),
+    def __init__(self,index_folder, incremental=False, batch_analyzer=False, merge_policy=None):
+        self.index_folder = index_folder
+        self.incremental = incremental
+        # Política de fusión de segmentos de los commits incrementales (ver maintenance.py)
+        self.merge_policy = merge_policy or TieredMergePolicy()
+        # Con -batchAnalyzer se indexa con BatchAnalyzer, que produce los mismos términos
+        language_analyzer = CustomAnalyzer(batch=batch_analyzer)
+        schema = Schema(path=ID(stored=True, unique=True), autor=TEXT(analyzer=language_analyzer),
                         director=TEXT(analyzer=language_analyzer), departamento=TEXT(analyzer=language_analyzer),
                         titulo=TEXT(analyzer=language_analyzer), descripcion=TEXT(analyzer=language_analyzer),
                         subject=TEXT(analyzer=language_analyzer), anyo=NUMERIC())
         create_folder(index_folder)
-        index = create_in(index_folder, schema)
+        index = None
+        if incremental and exists_in(index_folder):
+            index = open_dir(index_folder)
+            if not supports_incremental(index, index_folder):
+                print("Index has no manifest or unique path field; rebuilding it")
+                index = None
+        if index is None:
+            index = create_in(index_folder, schema)
+            # Índice nuevo: el manifiesto anterior ya no es válido
+            save_manifest(index_folder, {})
         self.writer = index.writer()
+        # El writer usa el esquema leído del TOC; su filtro de stemming arranca
+        # con la caché guardada junto al índice en la ejecución anterior
+        self.stem_filter = get_stem_filter(self.writer.schema['titulo'].analyzer)
+        if self.stem_filter is not None:
+            self.stem_filter.load_cache(index_folder)
+
+    def commit(self):
+        if self.incremental:
+            self.writer.commit(mergetype=self.merge_policy)
+        else:
+            self.writer.commit()
+        # Columna de path por docnum para leer las páginas de resultados
+        build_doc_values(self.index_folder)
+        if self.stem_filter is not None:
+            self.stem_filter.save_cache(self.index_folder)
+        if self.stem_filter is not None and self.stem_filter.hits + self.stem_filter.misses > 0:
+            print(f"Stem cache: {self.stem_filter.hits} hits, {self.stem_filter.misses} misses "
+                  f"({100 * self.stem_filter.hit_rate():.1f}% hit rate)")
 
     def index_docs(self,docs_folder):
+        if self.incremental:
+            self.index_docs_incremental(docs_folder)
+            return
         if (os.path.exists(docs_folder)):
             for file in sorted(os.listdir(docs_folder)):
                 #print(file) # Debug: print the file name being processed
                 if file.endswith('.xml'):
                     self.index_xml_doc(docs_folder, file)
-        self.writer.commit()
+        self.commit()
+
+    def index_docs_incremental(self, docs_folder):
+        # Compara cada fichero con su entrada del manifiesto. Si mtime y tamaño
+        # coinciden no se vuelve a leer; si cambian se comprueba el hash antes
+        # de reindexarlo con update_document sobre el campo path.
+        old_manifest = load_manifest(self.index_folder)
+        manifest = {}
+        files = []
+        if (os.path.exists(docs_folder)):
+            files = [file for file in sorted(os.listdir(docs_folder)) if file.endswith('.xml')]
+        # Primero los borrados, por si otro fichero reutiliza el mismo identificador
+        current = set(files)
+        deleted = 0
+        for file, entry in old_manifest.items():
+            if file not in current:
+                for doc_id in entry_ids(entry):
+                    self.writer.delete_by_term('path', doc_id)
+                deleted += 1
+        added, updated = 0, 0
+        for file in files:
+            file_path = os.path.join(docs_folder, file)
+            stat = os.stat(file_path)
+            entry = old_manifest.get(file)
+            if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                manifest[file] = entry
+                continue
+            digest = file_hash(file_path)
+            if entry is not None and entry['hash'] == digest:
+                manifest[file] = dict(entry, mtime=stat.st_mtime, size=stat.st_size)
+                continue
+            docs = list(MyIndex.parse_xml_docs(docs_folder, file))
+            ids = [fields['path'] for fields in docs]
+            if entry is not None:
+                for doc_id in set(entry_ids(entry)) - set(ids):
+                    self.writer.delete_by_term('path', doc_id)
+            for fields in docs:
+                self.writer.update_document(**fields)
+            manifest[file] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': digest, 'ids': ids}
+            if entry is None:
+                added += 1
+            else:
+                updated += 1
+        self.commit()
+        save_manifest(self.index_folder, manifest)
+        print(f"Incremental update: {added} added, {updated} updated, {deleted} deleted")
 
     def index_xml_doc(self, foldername, filename):
+        for fields in MyIndex.parse_xml_docs(foldername, filename):
+            self.writer.add_document(**fields)
+
+    # Campos de cada registro Dublin Core del fichero, sin tocar el writer, para
+    # poder usarlos tanto con add_document como con update_document. Se omiten
+    # los registros sin dc:identifier.
+    @staticmethod
+    def parse_xml_docs(foldername, filename):
         file_path = os.path.join(foldername, filename)
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        namespaces = { 'dc': 'http://purl.org/dc/elements/1.1/' }
-
-        directores = ""
-        subjects = ""
-
-        path_element = root.find('.//dc:identifier', namespaces)
-        autor_element = root.find('.//dc:creator', namespaces)
-        director_element = root.findall('.//dc:contributor', namespaces)
-
-        for dir in director_element:
-            directores += str(dir.text) + " "
-
-        departamento_element = root.find('.//dc:publisher', namespaces)
-
-        title_element = root.find('.//dc:title', namespaces)
-        description_element = root.find('.//dc:description', namespaces)
-
-        subject_element = root.findall('.//dc:subject', namespaces)
-
-        for subj in subject_element:
-            subjects += str(subj.text) + " "
-
-        anyo_element = root.find('.//dc:date', namespaces)
-
-        #raw_text = "".join(root.itertext())
-        # break into lines and remove leading and trailing space on each
-        #text = ' '.join(line.strip() for line in raw_text.splitlines() if line)
-        # print(text)
-        
-        self.writer.add_document(path=path_element.text,
-                                 autor=autor_element.text if autor_element is not None else "",
-                                 director=str(directores),
-                                 departamento=departamento_element.text if departamento_element is not None else "",
-                                 titulo=title_element.text if title_element is not None else "",
-                                 descripcion=description_element.text if description_element is not None else "",
-                                 subject=str(subjects),
-                                 anyo=int(anyo_element.text) if anyo_element is not None else 0)
+        for record in iter_records(file_path):
+            if first(record, 'identifier') is not None:
+                yield MyIndex.record_fields(record)
+
+    @staticmethod
+    def record_fields(record):
+        # Un campo ausente se indexa como "" y uno vacío como None, igual que con
+        # element.text; varios contributor o subject se concatenan
+        directores = "".join(str(text) + " " for text in record.get('contributor', []))
+        subjects = "".join(str(text) + " " for text in record.get('subject', []))
+
+        return dict(path=first(record, 'identifier'),
+                    autor=record.get('creator', [""])[0],
+                    director=directores,
+                    departamento=record.get('publisher', [""])[0],
+                    titulo=record.get('title', [""])[0],
+                    descripcion=record.get('description', [""])[0],
+                    subject=subjects,
+                    anyo=int(first(record, 'date')) if 'date' in record else 0)
 
 if __name__ == '__main__':
 
     # Valores por defecto
     index_folder = '../whooshindex'
     docs_folder = '../docs'
+    incremental = False
+    batch_analyzer = False
+    merge_options = {}
     i = 1
     while i < len(sys.argv):
         if sys.argv[i] == '-index':
@@ -96,9 +209,19 @@ if __name__ == '__main__':
         elif sys.argv[i] == '-docs':
             docs_folder = sys.argv[i + 1]
             i = i + 1
+        elif sys.argv[i] == '-incremental':
+            incremental = True
+        elif sys.argv[i] == '-batchAnalyzer':
+            batch_analyzer = True
+        elif sys.argv[i] == '-segmentsPerTier':
+            merge_options['segments_per_tier'] = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-maxDeleted':
+            merge_options['max_deleted_ratio'] = float(sys.argv[i + 1])
+            i = i + 1
         i = i + 1
 
-    my_index = MyIndex(index_folder)
+    my_index = MyIndex(index_folder, incremental, batch_analyzer, TieredMergePolicy(**merge_options))
     my_index.index_docs(docs_folder)
 
 
@@ -0,0 +1,87 @@
+"""
+instrumentation.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Medición opcional del tiempo de cada etapa de una consulta en MySearcher (análisis de la consulta,
+búsqueda, lectura de campos almacenados, filtro espacial, escritura...) y de contadores como el
+número de resultados. Cada consulta produce un registro que puede escribirse como una línea JSON,
+y al final de la ejecución summary() resume cada etapa con su media y percentiles.
+"""
+
+import json
+import math
+import time
+from contextlib import contextmanager
+
+def percentile(values, p):
+    # Percentil por el método del rango más cercano sobre la lista ordenada
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+class StageTimer:
+    def __init__(self, log_file=None):
+        self.records = []
+        self.current = None
+        self.log = open(log_file, 'w', encoding='utf-8') if log_file else None
+
+    def begin(self, query_num=None, query_text=None):
+        self.end()
+        self.current = {"q": query_num, "query": query_text, "stages": {}, "counters": {}}
+        self.query_start = time.perf_counter()
+
+    def end(self):
+        if self.current is None:
+            return
+        self.current["total_ms"] = round((time.perf_counter() - self.query_start) * 1000, 4)
+        self.current["stages"] = {name: round(ms, 4) for name, ms in self.current["stages"].items()}
+        self.records.append(self.current)
+        if self.log:
+            self.log.write(json.dumps(self.current, ensure_ascii=False) + "\n")
+        self.current = None
+
+    # Las etapas se acumulan: una etapa medida en cada resultado suma todas sus veces
+    @contextmanager
+    def stage(self, name):
+        if self.current is None:
+            self.begin()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = self.current["stages"]
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def count(self, name, n=1):
+        if self.current is None:
+            self.begin()
+        counters = self.current["counters"]
+        counters[name] = counters.get(name, 0) + n
+
+    def close(self):
+        self.end()
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    def summary(self):
+        self.end()
+        stages = {}
+        for record in self.records:
+            stages.setdefault("total", []).append(record["total_ms"])
+            for name, ms in record["stages"].items():
+                stages.setdefault(name, []).append(ms)
+        lines = [f"{'stage':16} {'queries':>8} {'total_ms':>10} {'mean_ms':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9}"]
+        for name, values in stages.items():
+            values.sort()
+            lines.append(f"{name:16} {len(values):>8} {sum(values):>10.2f} {sum(values) / len(values):>9.3f} "
+                         f"{percentile(values, 50):>9.3f} {percentile(values, 95):>9.3f} "
+                         f"{percentile(values, 99):>9.3f} {values[-1]:>9.3f}")
+        counters = {}
+        for record in self.records:
+            for name, n in record["counters"].items():
+                counters[name] = counters.get(name, 0) + n
+        if counters:
+            lines.append("counters: " + ", ".join(f"{name}={n}" for name, n in counters.items()))
+        return "\n".join(lines)
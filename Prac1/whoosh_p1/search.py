@@ -3,43 +3,180 @@ search.py
 Author: Jorge Pagan Saiz and Jiahao Ye
 Last update: 2025-09-28
 
-Usage: python search.py -index <indexPath> -infoNeeds <queryFile> -output <resultFile>
+Usage: python search.py -index <indexPath> -infoNeeds <queryFile> -output <resultFile> [-format <tsv|jsonl>] [-cache <cacheFile>]
+       [-timings <logFile>] [-profile] [-workers <N>]
+       [-model <tfidf|bm25>] [-boosts <campo=peso,...>] [-B <B>] [-K1 <K1>] [-fieldB <campo=B,...>]
+
+Con -cache la caché de resultados se carga del fichero al arrancar y se guarda al terminar; sin él
+la caché solo dura lo que dura la ejecución.
+Con -timings se mide cada etapa de cada consulta, se escribe un registro JSON por consulta en
+logFile y al final se imprime un resumen por etapa. Con -profile la ejecución se hace bajo cProfile
+y las estadísticas se guardan en <resultFile>.prof y se imprimen ordenadas por tiempo acumulado.
+Con -workers N (N > 1) el fichero de -infoNeeds se reparte entre un pool de N procesos, cada uno con
+su propio MySearcher sobre el mismo índice; los resultados se escriben en el orden de las consultas.
+En ese modo no se crea el MySearcher del proceso principal, así que -cache y -timings no se usan
+y -profile solo cubre el reparto de las consultas y la escritura de resultados.
+Con -boosts la puntuación de cada término de la consulta se multiplica por el peso de su campo
+(p. ej. titulo=2,descripcion=0.5). -B, -K1 y -fieldB (B por campo) son los parámetros de BM25F y solo
+se usan con -model bm25. sweep.py evalúa rejillas de estos parámetros.
 """
 
 import sys
+from contextlib import nullcontext
 
 from whoosh.qparser import QueryParser, MultifieldParser
 from whoosh.qparser import OrGroup
 from whoosh import scoring
 import whoosh.index as index
 
+from analyzer import get_stem_filter
+from result_sink import open_result_sink
+from doc_values import load_doc_values, index_identity
+from query_cache import QueryCache
+from instrumentation import StageTimer
+
+NO_TIMING = nullcontext()
+
+# Parámetros por defecto de scoring.BM25F
+DEFAULT_B = 0.75
+DEFAULT_K1 = 1.2
+
+# "titulo=2,descripcion=0.5" -> {'titulo': 2.0, 'descripcion': 0.5}
+def parse_field_values(text):
+    values = {}
+    for item in text.split(","):
+        if item.strip():
+            fieldname, value = item.split("=")
+            values[fieldname.strip()] = float(value)
+    return values
+
+# Multiplica el boost de cada hoja de la consulta por el peso de su campo. El parámetro
+# fieldboosts de MultifieldParser solo afecta a los términos sin campo explícito, y en
+# consultas como "titulo:fraude AND autor:Lázaro" no tendría efecto.
+def apply_field_boosts(query, field_boosts):
+    def boost_leaf(q):
+        if q.is_leaf() and q.field() in field_boosts:
+            q.boost *= field_boosts[q.field()]
+        return q
+    return query.accept(boost_leaf) if field_boosts else query
+
 class MySearcher:
-    def __init__(self, index_folder, model_type = 'tfidf'):
+    def __init__(self, index_folder, model_type = 'tfidf', cache_size=1024, timer=None,
+                 field_boosts=None, B=DEFAULT_B, K1=DEFAULT_K1, field_B=None):
+        self.model_type = model_type
+        self.field_boosts = field_boosts or {}
+        # timer es un StageTimer de instrumentation; sin él no se mide nada
+        self.timer = timer
+        # Con cache_size=0 no se guardan resultados
+        self.cache = QueryCache(cache_size) if cache_size else None
         ix = index.open_dir(index_folder)
+        # ix.schema se lee del TOC en cada acceso; se guarda una sola copia para
+        # que el parser use el filtro de stemming con la caché precargada
+        schema = ix.schema
+        stem_filter = get_stem_filter(schema['titulo'].analyzer)
+        if stem_filter is not None:
+            stem_filter.load_cache(index_folder)
         if model_type == 'tfidf':
             self.searcher = ix.searcher(weighting=scoring.TF_IDF())
+            self.ranking = model_type
         else:
-            self.searcher = ix.searcher()
+            field_B = field_B or {}
+            self.searcher = ix.searcher(weighting=scoring.BM25F(B=B, K1=K1, **{f"{fieldname}_B": value for fieldname, value in field_B.items()}))
+            # Los boosts ya forman parte de la consulta; B y K1 van en la clave de la caché
+            self.ranking = f"bm25(B={B},K1={K1},{sorted(field_B.items())})"
         self.parser = MultifieldParser(["autor", "director", "departamento", "titulo", "descripcion", "subject", "anyo"],
-                                       ix.schema, group = OrGroup)
-
-    def search(self, query_text, output_file, query_num, limit=100):
-        query = self.parser.parse(query_text)
-        results = self.searcher.search(query, limit=limit)
-        for result in results:
-            with open(output_file, 'a', encoding='utf-8') as output:
-                doc_id = result.get("path")
+                                       schema, group = OrGroup)
+        # Generación e ids de segmento del lector, para la caché de resultados y doc_values
+        self.identity = index_identity(self.searcher.reader())
+        self.doc_values = load_doc_values(index_folder, self.identity)
+
+    # Campos names de cada docnum de una página de resultados: de las columnas de
+    # doc_values si están al día con el índice y, si no, de los campos almacenados
+    def page_fields(self, docnums, names):
+        if self.doc_values is not None:
+            return self.doc_values.rows(docnums, names)
+        return [tuple(fields.get(name) for name in names) for fields in map(self.searcher.stored_fields, docnums)]
+
+    def stage(self, name):
+        return self.timer.stage(name) if self.timer else NO_TIMING
+
+    # Ejecuta la consulta y devuelve la lista de (doc_id, score) sin escribir nada
+    def query_results(self, query_text, limit=100):
+        with self.stage("parse"):
+            query = apply_field_boosts(self.parser.parse(query_text), self.field_boosts)
+        if self.cache is None:
+            return self.run_query(query, limit)
+        # La clave es la consulta ya analizada y normalizada, así que textos que
+        # solo difieren en mayúsculas, tildes, flexiones o espacios comparten entrada
+        with self.stage("cache"):
+            key = f"{query.normalize()!r}|{limit}|{self.ranking}"
+            res = self.cache.get(key, self.identity)
+        if res is None:
+            res = self.run_query(query, limit)
+            self.cache.put(key, res)
+        elif self.timer:
+            self.timer.count("cache_hits")
+        return res
+
+    def run_query(self, query, limit=100):
+        res = []
+        with self.stage("search"):
+            results = list(self.searcher.search(query, limit=limit).items())
+        with self.stage("stored_fields"):
+            rows = self.page_fields([docnum for docnum, _ in results], ("path",))
+            for (_, score), (doc_id,) in zip(results, rows):
                 if(doc_id):
-                    output.write(f"{query_num}\t{doc_id}\n")
+                    res.append((doc_id, score))
                 #Opción para depurar, de poco interés en ejecución
                 #else:
                 #    print("Error: Document without dc_identifier field")
+        if self.timer:
+            self.timer.count("hits", len(res))
+        return res
+
+    # output es un sink de result_sink, abierto una vez para toda la ejecución
+    def search(self, query_text, output, query_num, limit=100):
+        if self.timer:
+            self.timer.begin(query_num, query_text)
+        res = self.query_results(query_text, limit)
+        with self.stage("output"):
+            output.write(query_num, res)
+        if self.timer:
+            self.timer.end()
+
+# Un MySearcher por proceso del pool, creado una sola vez por init_search_worker
+WORKER_SEARCHER = None
+
+def init_search_worker(index_folder, model_type, options):
+    global WORKER_SEARCHER
+    WORKER_SEARCHER = MySearcher(index_folder, model_type, **options)
+
+def search_task(task):
+    query_text, limit = task
+    return WORKER_SEARCHER.query_results(query_text, limit)
+
+def search_parallel(index_folder, queries, output, workers, model_type='tfidf', limit=100, chunksize=8, **options):
+    # imap devuelve los resultados en el orden de las consultas, así que se escriben
+    # según llegan con la misma numeración que la ejecución en serie
+    from multiprocessing import Pool
+    tasks = [(query_text, limit) for query_text in queries]
+    with Pool(workers, initializer=init_search_worker, initargs=(index_folder, model_type, options)) as pool:
+        for query_num, res in enumerate(pool.imap(search_task, tasks, chunksize=chunksize), start=1):
+            output.write(query_num, res)
 
 
 if __name__ == '__main__':
     index_folder = '../index'
     info_PATH = None
     output_PATH = '../result.txt'
+    output_format = 'tsv'
+    cache_PATH = None
+    timings_PATH = None
+    profile = False
+    workers = 1
+    model_type = 'tfidf'
+    # Opciones de ranking de MySearcher: field_boosts, B, K1 y field_B
+    ranking = {}
     i = 1
     while (i < len(sys.argv)):
         if sys.argv[i] == '-index':
@@ -51,21 +188,74 @@ if __name__ == '__main__':
         if(sys.argv[i] == '-output'):
             output_PATH = sys.argv[i+1]
             i = i + 1
+        if(sys.argv[i] == '-format'):
+            output_format = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-cache'):
+            cache_PATH = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-timings'):
+            timings_PATH = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-profile'):
+            profile = True
+        if(sys.argv[i] == '-workers'):
+            workers = int(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-model'):
+            model_type = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-boosts'):
+            ranking['field_boosts'] = parse_field_values(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-B'):
+            ranking['B'] = float(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-K1'):
+            ranking['K1'] = float(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-fieldB'):
+            ranking['field_B'] = parse_field_values(sys.argv[i+1])
+            i = i + 1
         i = i + 1
 
-    searcher = MySearcher(index_folder)
+    timer = StageTimer(timings_PATH) if timings_PATH else None
+    # Con -workers cada proceso del pool abre su propio MySearcher
+    parallel = info_PATH is not None and workers > 1
+    searcher = None if parallel else MySearcher(index_folder, model_type, timer=timer, **ranking)
+    if cache_PATH and searcher is not None and searcher.cache is not None:
+        searcher.cache.load(cache_PATH)
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
     # Ejecucion con fichero de queries
     if info_PATH:
-        with open(info_PATH, 'r', encoding='utf-8') as f, open(output_PATH, 'w', encoding='utf-8') as out:
-            query_num = 1
-            for line in f:
-                query = line.strip()
-                if(query):
-                    searcher.search(query, output_file=output_PATH, query_num=query_num)
-                    query_num += 1
+        with open(info_PATH, 'r', encoding='utf-8') as f, open_result_sink(output_PATH, output_format) as out:
+            queries = [line.strip() for line in f if line.strip()]
+            if parallel:
+                search_parallel(index_folder, queries, out, workers, model_type, **ranking)
+            else:
+                for query_num, query in enumerate(queries, start=1):
+                    searcher.search(query, output=out, query_num=query_num)
     # Alternativa interactiva por si se quiere prescindir de un fichero de queries
     else:
-        query = input('Introduce a query (\'q\' for exit): ')
-        while query != 'q':
-            searcher.search(query, output_file=output_PATH, query_num=1)
-            query = input('Introduce a query (\'q\' for exit): ')
\ No newline at end of file
+        with open_result_sink(output_PATH, output_format, mode='a') as out:
+            query = input('Introduce a query (\'q\' for exit): ')
+            while query != 'q':
+                searcher.search(query, output=out, query_num=1)
+                out.flush()
+                query = input('Introduce a query (\'q\' for exit): ')
+    if profile:
+        profiler.disable()
+        profiler.dump_stats(output_PATH + '.prof')
+        import pstats
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(30)
+    if timer:
+        print(timer.summary())
+        timer.close()
+    if searcher is not None and searcher.cache is not None:
+        if searcher.cache.hits + searcher.cache.misses > 0:
+            print(searcher.cache.stats())
+        if cache_PATH:
+            searcher.cache.save(cache_PATH)
\ No newline at end of file
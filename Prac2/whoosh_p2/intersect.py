@@ -1,5 +1,78 @@
 def intersect(Xmin, Xmax, Ymin, Ymax, West, East, South, North):
-    if (Xmin <= East and Xmax >= West and Ymin <= North and Ymax >= South): 
+    if (Xmin <= East and Xmax >= West and Ymin <= North and Ymax >= South):
         return True
     else:
-        return False
\ No newline at end of file
+        return False
+
+# Versión por lotes de intersect. Las cajas de documentos son un array (N, 4) con
+# columnas west, east, south, north; las de consulta, (4,) para una consulta o
+# (Q, 4) para varias, con el mismo orden que los argumentos de intersect.
+# numpy se importa dentro de cada función para que "from intersect import intersect"
+# no lo cargue.
+
+def load_boxes(reader):
+    # Lee una sola vez las cajas almacenadas en el índice. Devuelve los docnum y
+    # el array de cajas; los documentos sin datos espaciales se omiten.
+    import numpy as np
+    docnums = []
+    boxes = []
+    for docnum, fields in reader.iter_docs():
+        box = (fields.get("west"), fields.get("east"), fields.get("south"), fields.get("north"))
+        if None not in box:
+            docnums.append(docnum)
+            boxes.append(box)
+    return np.array(docnums, dtype=np.int64), np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+def _split(boxes, queries):
+    import numpy as np
+    boxes = np.asarray(boxes, dtype=np.float64)
+    queries = np.asarray(queries, dtype=np.float64)
+    single = queries.ndim == 1
+    queries = np.atleast_2d(queries)
+    # Consultas en filas y documentos en columnas: (Q, 1) frente a (N,)
+    q = [queries[:, i:i + 1] for i in range(4)]
+    d = [boxes[:, i] for i in range(4)]
+    return q, d, single
+
+def intersect_many(boxes, queries):
+    # Máscara booleana (N,) para una consulta o (Q, N) para varias
+    (Xmin, Xmax, Ymin, Ymax), (West, East, South, North), single = _split(boxes, queries)
+    mask = (Xmin <= East) & (Xmax >= West) & (Ymin <= North) & (Ymax >= South)
+    return mask[0] if single else mask
+
+def overlap_area(boxes, queries):
+    # Área de la intersección de cada caja con la consulta (0 si no intersectan)
+    import numpy as np
+    (Xmin, Xmax, Ymin, Ymax), (West, East, South, North), single = _split(boxes, queries)
+    width = np.clip(np.minimum(Xmax, East) - np.maximum(Xmin, West), 0.0, None)
+    height = np.clip(np.minimum(Ymax, North) - np.maximum(Ymin, South), 0.0, None)
+    area = width * height
+    return area[0] if single else area
+
+def overlap_score(boxes, queries):
+    # Área de la intersección entre área de la unión (0 sin solape, 1 si son iguales)
+    import numpy as np
+    inter = overlap_area(boxes, queries)
+    boxes = np.asarray(boxes, dtype=np.float64)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+    box_area = (boxes[:, 1] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 2])
+    query_area = ((queries[:, 1] - queries[:, 0]) * (queries[:, 3] - queries[:, 2]))[:, None]
+    if inter.ndim == 1:
+        query_area = query_area[0]
+    union = box_area + query_area - inter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.where(union > 0, inter / union, 0.0)
+    return score
+
+def rank_by_overlap(docnums, boxes, query, k=100):
+    # Los k documentos con mayor overlap_score para una consulta, como
+    # arrays (docnum, score) ordenados de mayor a menor. Cuentan todas las cajas
+    # que intersect da por buenas (intervalos cerrados), también las que solo
+    # tocan la consulta o no tienen área y puntúan 0
+    import numpy as np
+    scores = overlap_score(boxes, query)
+    hits = np.flatnonzero(intersect_many(boxes, query))
+    if len(hits) > k:
+        hits = np.sort(hits[np.argpartition(-scores[hits], k - 1)[:k]])
+    order = hits[np.argsort(-scores[hits], kind='stable')]
+    return np.asarray(docnums)[order], scores[order]
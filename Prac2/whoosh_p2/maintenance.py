@@ -0,0 +1,194 @@
+"""
+maintenance.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Mantenimiento del índice whoosh: informe de segmentos (documentos, borrados y tamaño), fusión
+forzada hasta N segmentos y limpieza del fichero de bloqueo de escritura.
+
+Cada commit incremental escribe un segmento nuevo con los documentos añadidos o actualizados y
+marca como borradas sus versiones anteriores. La política por defecto de whoosh (MERGE_SMALL) solo
+fusiona segmentos muy pequeños, así que con actualizaciones de unas decenas de documentos los
+segmentos se acumulan y cada búsqueda recorre todos ellos. TieredMergePolicy, que index.py usa en
+los commits incrementales, agrupa los segmentos en niveles por número de documentos y fusiona un
+nivel cuando acumula segments_per_tier segmentos, o un segmento con demasiados borrados.
+
+Al fusionar cambian los docnum y la generación del índice, así que después se reconstruyen el
+índice espacial (spatial.py) y las columnas de doc_values.py.
+
+whoosh bloquea MAIN_WRITELOCK con flock (msvcrt en Windows) y no borra el fichero al terminar. Un
+fichero que nadie tiene bloqueado es un resto inofensivo de una ejecución anterior; el informe indica
+si está libre ('stale') o si lo tiene un writer ('held'). No se borra nunca: un writer que ya lo
+hubiera abierto bloquearía el fichero borrado mientras otro bloquea el nuevo, y habría dos a la vez.
+
+Usage: python maintenance.py -index <indexPath> [-optimize <numSegments>] [-json]
+"""
+
+import json
+import os
+import sys
+
+from whoosh.index import open_dir, exists_in, TOC
+from whoosh.filedb.filestore import FileStorage
+from whoosh.reading import SegmentReader
+
+from spatial import build_spatial_index, BOX_FIELDS
+from doc_values import build_doc_values
+
+# Nombre del índice por defecto de whoosh y de su fichero de bloqueo de escritura
+INDEX_NAME = 'MAIN'
+WRITELOCK_FILE = INDEX_NAME + '_WRITELOCK'
+
+# Cada segmento cuesta más en whoosh que en un motor compilado, así que se admiten menos por
+# nivel que los 10 habituales: con 4, la latencia se mantiene estable tras muchos commits
+DEFAULT_SEGMENTS_PER_TIER = 4
+DEFAULT_MAX_MERGE_AT_ONCE = 10
+DEFAULT_FLOOR_DOCS = 1000
+DEFAULT_MAX_DELETED_RATIO = 0.3
+
+def deleted_ratio(segment):
+    total = segment.doc_count_all()
+    return segment.deleted_count() / total if total else 0.0
+
+def merge_segments(writer, segments, to_merge):
+    # Copia los documentos vivos de to_merge al segmento nuevo del writer y devuelve
+    # los segmentos que se conservan, como las políticas de whoosh.writing
+    for segment in to_merge:
+        reader = SegmentReader(writer.storage, writer.schema, segment)
+        writer.add_reader(reader)
+        reader.close()
+    merged = {segment.segment_id() for segment in to_merge}
+    return [segment for segment in segments if segment.segment_id() not in merged]
+
+class TieredMergePolicy:
+    # Política de fusión para writer.commit(mergetype=...). El nivel 0 son los segmentos
+    # de hasta floor_docs documentos vivos y cada nivel es segments_per_tier veces mayor
+    # que el anterior. Un commit fusiona como mucho un grupo: los max_merge_at_once
+    # segmentos más pequeños del nivel más bajo que tenga segments_per_tier segmentos o,
+    # si no hay ninguno, los segmentos con más de max_deleted_ratio de borrados.
+    def __init__(self, segments_per_tier=DEFAULT_SEGMENTS_PER_TIER, max_merge_at_once=DEFAULT_MAX_MERGE_AT_ONCE,
+                 floor_docs=DEFAULT_FLOOR_DOCS, max_deleted_ratio=DEFAULT_MAX_DELETED_RATIO):
+        if segments_per_tier < 2:
+            raise ValueError("segments_per_tier must be at least 2")
+        self.segments_per_tier = segments_per_tier
+        self.max_merge_at_once = max(2, max_merge_at_once)
+        self.floor_docs = floor_docs
+        self.max_deleted_ratio = max_deleted_ratio
+
+    def tier(self, segment):
+        docs = segment.doc_count()
+        tier, limit = 0, self.floor_docs
+        while docs > limit:
+            limit *= self.segments_per_tier
+            tier += 1
+        return tier
+
+    def select(self, segments):
+        tiers = {}
+        for segment in segments:
+            tiers.setdefault(self.tier(segment), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.segments_per_tier:
+                return sorted(tiers[tier], key=lambda segment: segment.doc_count())[:self.max_merge_at_once]
+        deleted = [segment for segment in segments if deleted_ratio(segment) > self.max_deleted_ratio]
+        return sorted(deleted, key=lambda segment: segment.doc_count_all())[:self.max_merge_at_once]
+
+    def __call__(self, writer, segments):
+        return merge_segments(writer, segments, self.select(segments))
+
+class ForceMergePolicy:
+    # Fusiona los segmentos más pequeños en uno para dejar como mucho max_segments.
+    # Con max_segments=1 equivale a writing.OPTIMIZE
+    def __init__(self, max_segments=1):
+        self.max_segments = max(1, max_segments)
+
+    def select(self, segments):
+        if len(segments) <= self.max_segments:
+            return []
+        return sorted(segments, key=lambda segment: segment.doc_count())[:len(segments) - self.max_segments + 1]
+
+    def __call__(self, writer, segments):
+        return merge_segments(writer, segments, self.select(segments))
+
+def segment_report(index_folder):
+    storage = FileStorage(index_folder)
+    files = {name: storage.file_length(name) for name in storage.list()}
+    report = {"generation": None, "segments": [], "docs": 0, "deleted": 0, "deleted_ratio": 0.0,
+              "size_bytes": sum(files.values()), "write_lock": write_lock_state(index_folder)}
+    if not exists_in(index_folder):
+        return report
+    toc = TOC.read(storage, INDEX_NAME)
+    report["generation"] = toc.generation
+    for segment in toc.segments:
+        segment_id = segment.segment_id()
+        report["segments"].append({"id": segment_id,
+                                   "docs": segment.doc_count(),
+                                   "deleted": segment.deleted_count(),
+                                   "deleted_ratio": round(deleted_ratio(segment), 4),
+                                   "size_bytes": sum(size for name, size in files.items() if name.startswith(segment_id))})
+    report["docs"] = sum(segment["docs"] for segment in report["segments"])
+    report["deleted"] = sum(segment["deleted"] for segment in report["segments"])
+    total = report["docs"] + report["deleted"]
+    report["deleted_ratio"] = round(report["deleted"] / total, 4) if total else 0.0
+    return report
+
+def print_report(report):
+    print(f"Generation {report['generation']}: {len(report['segments'])} segments, {report['docs']} docs, "
+          f"{report['deleted']} deleted ({100 * report['deleted_ratio']:.1f}%), "
+          f"{report['size_bytes'] / 2**20:.2f} MB, write lock: {report['write_lock']}")
+    for segment in report["segments"]:
+        print(f"  {segment['id']:28} {segment['docs']:>8} docs {segment['deleted']:>8} deleted "
+              f"({100 * segment['deleted_ratio']:5.1f}%) {segment['size_bytes'] / 2**20:>8.2f} MB")
+
+# 'none' si no hay fichero de bloqueo, 'held' si un writer lo tiene bloqueado y
+# 'stale' si el fichero existe pero nadie lo bloquea
+def write_lock_state(index_folder):
+    if not os.path.exists(os.path.join(index_folder, WRITELOCK_FILE)):
+        return 'none'
+    lock = FileStorage(index_folder).lock(WRITELOCK_FILE)
+    if not lock.acquire():
+        return 'held'
+    lock.release()
+    return 'stale'
+
+def force_merge(index_folder, max_segments=1):
+    # Devuelve True si se ha fusionado algo. Sin nada que fusionar no se hace commit,
+    # para no cambiar la generación (que invalida la caché de resultados)
+    policy = ForceMergePolicy(max_segments)
+    writer = open_dir(index_folder).writer()
+    if not policy.select(writer.segments):
+        writer.cancel()
+        return False
+    writer.commit(mergetype=policy)
+    build_spatial_index(index_folder)
+    build_doc_values(index_folder, BOX_FIELDS)
+    return True
+
+
+if __name__ == '__main__':
+    index_folder = '../whooshindex'
+    max_segments = None
+    as_json = False
+    i = 1
+    while i < len(sys.argv):
+        if sys.argv[i] == '-index':
+            index_folder = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-optimize':
+            max_segments = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-json':
+            as_json = True
+        i = i + 1
+
+    if max_segments is not None:
+        before = len(segment_report(index_folder)["segments"])
+        if force_merge(index_folder, max_segments):
+            print(f"Merged {before} segments into {len(segment_report(index_folder)['segments'])}")
+        else:
+            print(f"Nothing to merge ({before} segments)")
+    report = segment_report(index_folder)
+    if as_json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
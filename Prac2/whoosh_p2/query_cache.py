@@ -0,0 +1,64 @@
+"""
+query_cache.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Caché LRU de resultados de consultas para MySearcher. La clave es la consulta ya analizada y
+normalizada junto con el límite y el modelo de ponderación. La caché recuerda la identidad del
+índice de sus resultados (doc_values.index_identity: la generación del TOC y los ids de sus
+segmentos) y se vacía sola cuando el índice cambia, también tras una reconstrucción completa, que
+vuelve a la generación 1. Puede guardarse en disco para reutilizarla entre ejecuciones.
+"""
+
+from collections import OrderedDict
+
+import json
+import os
+
+class QueryCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.identity = None
+        self.hits = 0
+        self.misses = 0
+
+    def check_identity(self, identity):
+        if identity != self.identity:
+            self.entries.clear()
+            self.identity = identity
+
+    def get(self, key, identity):
+        self.check_identity(identity)
+        res = self.entries.get(key)
+        if res is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return res
+
+    def put(self, key, res):
+        self.entries[key] = res
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return f"Query cache: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate():.1f}% hit rate)"
+
+    def load(self, cache_file):
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Los ficheros guardados antes solo tienen la generación y no se reutilizan
+            self.identity = data.get('identity')
+            for key, res in data['entries'][-self.max_size:]:
+                self.entries[key] = [tuple(hit) for hit in res]
+
+    def save(self, cache_file):
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'identity': self.identity, 'entries': list(self.entries.items())}, f, ensure_ascii=False)
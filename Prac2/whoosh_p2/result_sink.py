@@ -0,0 +1,80 @@
+"""
+result_sink.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Escritura de resultados de search.py. El fichero de salida se abre una sola vez por ejecución
+y las líneas se acumulan en memoria, volcándose en bloques de BUFFER_LINES líneas y al cerrar.
+
+Formatos:
+  tsv   -> una línea "query_num\\tdoc_id" por resultado, o solo "doc_id" con
+           query_num_column=False (la salida original de la práctica 2); las consultas espaciales
+           escriben "query_num\\tnum_docs\\tids\\tscores" en una sola línea
+  jsonl -> una línea {"q": query_num, "ids": [...], "scores": [...]} por consulta
+"""
+
+import json
+
+BUFFER_LINES = 10000
+
+# Búfer y fichero de salida comunes; cada formato añade write(query_num, res, spatial), donde
+# res es la lista de (doc_id, score) devuelta por MySearcher.query_results
+class ResultSink:
+    def __init__(self, output_file, mode='w'):
+        self.output = open(output_file, mode, encoding='utf-8')
+        self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_line(self, line):
+        self.buffer.append(line)
+        if len(self.buffer) >= BUFFER_LINES:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.output.write(''.join(self.buffer))
+            self.buffer = []
+        self.output.flush()
+
+    def close(self):
+        self.flush()
+        self.output.close()
+
+class TsvResultSink(ResultSink):
+    def __init__(self, output_file, mode='w', query_num_column=True):
+        super().__init__(output_file, mode)
+        self.query_num_column = query_num_column
+
+    def write(self, query_num, res, spatial=False):
+        if spatial:
+            # Extraer solo el número al inicio de cada identificador
+            numbers = [doc_id.split("-")[0] for doc_id, _ in res]
+            scores_str = [f"{s:.2f}" for _, s in res]
+            self.add_line(f"{query_num}\t{len(numbers)}\t{','.join(numbers)}\t{','.join(scores_str)}\n")
+        elif self.query_num_column:
+            for doc_id, _ in res:
+                self.add_line(f"{query_num}\t{doc_id}\n")
+        else:
+            for doc_id, _ in res:
+                self.add_line(f"{doc_id}\n")
+
+class JsonlResultSink(ResultSink):
+    def write(self, query_num, res, spatial=False):
+        self.add_line(json.dumps({"q": query_num,
+                                  "ids": [doc_id for doc_id, _ in res],
+                                  "scores": [round(score, 4) for _, score in res]},
+                                 ensure_ascii=False, separators=(',', ':')) + "\n")
+
+SINKS = {'tsv': TsvResultSink, 'jsonl': JsonlResultSink}
+
+def open_result_sink(output_file, fmt='tsv', mode='w', query_num_column=True):
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of: {', '.join(SINKS)}")
+    if fmt == 'tsv':
+        return TsvResultSink(output_file, mode, query_num_column)
+    return SINKS[fmt](output_file, mode)
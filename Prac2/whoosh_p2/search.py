@@ -3,99 +3,312 @@ search.py
 Author: Jorge Pagan Saiz and Jiahao Ye
 Last update: 2025-09-28
 
-Usage: python search.py -index <indexPath> -infoNeeds <queryFile> -output <resultFile>
+Usage: python search.py -index <indexPath> -infoNeeds <queryFile> -output <resultFile> [-format <tsv|jsonl>] [-cache <cacheFile>]
+       [-queryNumColumn] [-timings <logFile>] [-profile] [-workers <N>]
+       [-model <tfidf|bm25>] [-boosts <campo=peso,...>] [-B <B>] [-K1 <K1>] [-fieldB <campo=B,...>]
+
+En formato tsv las consultas no espaciales escriben un doc_id por línea; con -queryNumColumn cada
+línea empieza por el número de consulta ("query_num\tdoc_id"), como en la práctica 1 y como
+necesita evaluation.py.
+Con -cache la caché de resultados se carga del fichero al arrancar y se guarda al terminar; sin él
+la caché solo dura lo que dura la ejecución.
+Con -timings se mide cada etapa de cada consulta, se escribe un registro JSON por consulta en
+logFile y al final se imprime un resumen por etapa. Con -profile la ejecución se hace bajo cProfile
+y las estadísticas se guardan en <resultFile>.prof y se imprimen ordenadas por tiempo acumulado.
+Con -workers N (N > 1) el fichero de -infoNeeds se reparte entre un pool de N procesos, cada uno con
+su propio MySearcher sobre el mismo índice; los resultados se escriben en el orden de las consultas.
+En ese modo los workers no imprimen mensajes de depuración y no se crea el MySearcher del proceso
+principal, así que -cache y -timings no se usan y -profile solo cubre el reparto de las consultas y
+la escritura de resultados.
+Con -boosts la puntuación de cada término de la consulta se multiplica por el peso de su campo
+(p. ej. titulo=2,descripcion=0.5). -B, -K1 y -fieldB (B por campo) son los parámetros de BM25F y solo
+se usan con -model bm25. sweep.py evalúa rejillas de estos parámetros.
 """
 
 import sys
+import heapq
+from contextlib import nullcontext
 
-from intersect import intersect
 from whoosh.qparser import QueryParser, MultifieldParser
 from whoosh.qparser import OrGroup
-from whoosh.query import NumericRange
-from whoosh.query import And, Or
 from whoosh import scoring
 import whoosh.index as index
 
+from analyzer import get_stem_filter
+from result_sink import open_result_sink
+from spatial import load_spatial_index, BOX_FIELDS
+from doc_values import load_doc_values, index_identity
+from query_cache import QueryCache
+from instrumentation import StageTimer
+
+# Puntuación de la parte espacial: cada uno de los cuatro NumericRange de la
+# consulta original puntúa 1.0 al coincidir
+SPATIAL_SCORE = 4.0
+
+NO_TIMING = nullcontext()
+
+# Parámetros por defecto de scoring.BM25F
+DEFAULT_B = 0.75
+DEFAULT_K1 = 1.2
+
+# "titulo=2,descripcion=0.5" -> {'titulo': 2.0, 'descripcion': 0.5}
+def parse_field_values(text):
+    values = {}
+    for item in text.split(","):
+        if item.strip():
+            fieldname, value = item.split("=")
+            values[fieldname.strip()] = float(value)
+    return values
+
+# Multiplica el boost de cada hoja de la consulta por el peso de su campo. El parámetro
+# fieldboosts de MultifieldParser solo afecta a los términos sin campo explícito, y en
+# consultas como "titulo:fraude AND autor:Lázaro" no tendría efecto.
+def apply_field_boosts(query, field_boosts):
+    def boost_leaf(q):
+        if q.is_leaf() and q.field() in field_boosts:
+            q.boost *= field_boosts[q.field()]
+        return q
+    return query.accept(boost_leaf) if field_boosts else query
+
 class MySearcher:
-    def __init__(self, index_folder, model_type = 'tfidf'):
+    def __init__(self, index_folder, model_type = 'tfidf', verbose=True, cache_size=1024, timer=None,
+                 field_boosts=None, B=DEFAULT_B, K1=DEFAULT_K1, field_B=None):
+        self.verbose = verbose
+        self.model_type = model_type
+        self.field_boosts = field_boosts or {}
+        # timer es un StageTimer de instrumentation; sin él no se mide nada
+        self.timer = timer
+        # Con cache_size=0 no se guardan resultados
+        self.cache = QueryCache(cache_size) if cache_size else None
+        self.index_folder = index_folder
         ix = index.open_dir(index_folder)
+        # ix.schema se lee del TOC en cada acceso; se guarda una sola copia para
+        # que el parser use el filtro de stemming con la caché precargada
+        schema = ix.schema
+        stem_filter = get_stem_filter(schema['titulo'].analyzer)
+        if stem_filter is not None:
+            stem_filter.load_cache(index_folder)
         if model_type == 'tfidf':
             self.searcher = ix.searcher(weighting=scoring.TF_IDF())
+            self.ranking = model_type
         else:
-            self.searcher = ix.searcher()
+            field_B = field_B or {}
+            self.searcher = ix.searcher(weighting=scoring.BM25F(B=B, K1=K1, **{f"{fieldname}_B": value for fieldname, value in field_B.items()}))
+            # Los boosts ya forman parte de la consulta; B y K1 van en la clave de la caché
+            self.ranking = f"bm25(B={B},K1={K1},{sorted(field_B.items())})"
         self.parser = MultifieldParser(["autor", "director", "departamento", "titulo", "descripcion", "subject", "anyo", "east", "north", "west", "south"], schema=
-                                       ix.schema, group = OrGroup)
-
-    def search(self, query_text, output_file, query_num, limit=100):
-        if query_text.strip().lower().startswith("spatial"):
-            res = []
-            res_score = []
-            query = query_text.strip().split(" ")
-            spatial_query = query[0]
-            text_query = query[1] if len(query) > 1 else ""
+                                       schema, group = OrGroup)
+        # Generación e ids de segmento del lector, para la caché de resultados, el R-tree y doc_values
+        self.identity = index_identity(self.searcher.reader())
+        self.spatial_index = None
+        self.doc_values = None
+        self.load_sidecars()
+
+    def load_sidecars(self):
+        self.spatial_index = load_spatial_index(self.index_folder, self.identity)
+        if self.doc_values is not None:
+            self.doc_values.close()
+        self.doc_values = load_doc_values(self.index_folder, self.identity)
+
+    def refresh(self):
+        # Si se ha hecho commit de una nueva generación del índice se abre un
+        # searcher sobre ella; si no, refresh() devuelve el mismo searcher
+        if not self.searcher.up_to_date():
+            self.searcher = self.searcher.refresh()
+            self.identity = index_identity(self.searcher.reader())
+            self.load_sidecars()
+        elif self.spatial_index is None or self.doc_values is None:
+            # index.py escribe el R-tree y doc_values después de publicar la generación; si
+            # el refresh anterior llegó antes que ellos, se vuelven a buscar
+            self.load_sidecars()
+
+    # Campos names de cada docnum de una página de resultados: de las columnas de
+    # doc_values si están al día con el índice y, si no, de los campos almacenados
+    def page_fields(self, docnums, names):
+        if self.doc_values is not None:
+            return self.doc_values.rows(docnums, names)
+        return [tuple(fields.get(name) for name in names) for fields in map(self.searcher.stored_fields, docnums)]
+
+    def stage(self, name):
+        return self.timer.stage(name) if self.timer else NO_TIMING
+
+    def is_spatial(self, query_text):
+        return query_text.strip().lower().startswith("spatial")
+
+    # Ejecuta la consulta y devuelve la lista de (doc_id, score) sin escribir nada
+    def query_results(self, query_text, limit=100):
+        with self.stage("parse"):
+            box, query = self.parse_query(query_text)
+        if self.cache is None:
+            return self.run_query(box, query, limit)
+        # La clave es la consulta ya analizada y normalizada, así que textos que
+        # solo difieren en mayúsculas, tildes, flexiones o espacios comparten entrada.
+        # La identidad del lector vacía la caché cuando refresh() abre otra versión
+        with self.stage("cache"):
+            query_key = repr(query.normalize()) if query is not None else ""
+            key = f"{box}|{query_key}|{limit}|{self.ranking}"
+            res = self.cache.get(key, self.identity)
+        if res is None:
+            res = self.run_query(box, query, limit)
+            self.cache.put(key, res)
+        elif self.timer:
+            self.timer.count("cache_hits")
+        return res
+
+    # Devuelve la caja (west, east, south, north) de una consulta espacial, o None,
+    # y la consulta de texto ya analizada, o None si solo es espacial
+    def parse_query(self, query_text):
+        if not self.is_spatial(query_text):
+            return None, self.parse_text(query_text)
+        query = query_text.strip().split(" ")
+        spatial_query = query[0]
+        text_query = query[1] if len(query) > 1 else ""
+        if self.verbose:
             print("", text_query)
 
-            query = spatial_query.strip()[8:].strip().split(",")
-            west = float(query[0])
-            east = float(query[1])
-            south = float(query[2])
-            north = float(query[3])
+        query = spatial_query.strip()[8:].strip().split(",")
+        west = float(query[0])
+        east = float(query[1])
+        south = float(query[2])
+        north = float(query[3])
+        return (west, east, south, north), self.parse_text(text_query) if text_query else None
+
+    def parse_text(self, query_text):
+        return apply_field_boosts(self.parser.parse(query_text), self.field_boosts)
+
+    def run_query(self, box, query, limit=100):
+        res = self.execute(box, query, limit)
+        if self.timer:
+            self.timer.count("hits", len(res))
+        return res
+
+    def execute(self, box, query, limit=100):
+        res = []
+        if box is not None:
+            west, east, south, north = box
+            if self.spatial_index is not None:
+                return self.spatial_results(west, east, south, north, query, limit)
+            # Sin índice espacial válido: consultas NumericRange y filtro con intersect_many,
+            # que solo se importan en este caso (intersect_many usa numpy)
+            from whoosh.query import NumericRange, And, Or
+            from intersect import intersect_many
+
             westRangeQuery = NumericRange("west", start = None, end = east)
             eastRangeQuery = NumericRange("east", start = west, end = None)
             southRangeQuery = NumericRange("south", start = None, end = north)
             northRangeQuery = NumericRange("north", start = south, end = None)
 
             spatialQuery = And([westRangeQuery, eastRangeQuery, southRangeQuery, northRangeQuery])
-            final_query = Or([spatialQuery, self.parser.parse(text_query)]) if text_query else spatialQuery
-            results = self.searcher.search(final_query, limit=limit)
-
-            for result in results:
-                doc_id = result.get("path")
-                doc_west = result.get("west")
-                doc_east = result.get("east")
-                doc_south = result.get("south")
-                doc_north = result.get("north")
-                if(doc_west is not None and doc_east is not None and doc_south is not None and doc_north is not None) and intersect(west, east, south, north, doc_west, doc_east, doc_south, doc_north):
+            final_query = Or([spatialQuery, query]) if query is not None else spatialQuery
+            with self.stage("search"):
+                results = list(self.searcher.search(final_query, limit=limit).items())
+
+            with self.stage("stored_fields"):
+                rows = self.page_fields([docnum for docnum, _ in results], ("path",) + BOX_FIELDS)
+            # Las cajas de la página se comprueban de una vez; sin coordenadas no intersectan
+            with self.stage("intersect"):
+                with_box = [row_num for row_num, row in enumerate(rows) if None not in row[1:]]
+                inside = [False] * len(rows)
+                if with_box:
+                    mask = intersect_many([rows[row_num][1:] for row_num in with_box], box)
+                    for row_num, hit in zip(with_box, mask):
+                        inside[row_num] = bool(hit)
+            for (_, score), (doc_id, *_), hit in zip(results, rows, inside):
+                if hit:
                         if(doc_id):
-                            print("Debug: Found document", doc_id)
-                            res.append(doc_id)
-                            res_score.append(result.score)
-                        else:
+                            if self.verbose:
+                                print("Debug: Found document", doc_id)
+                            res.append((doc_id, score))
+                        elif self.verbose:
                             print("Error: Document without dc_identifier field")
                 else:
                     if doc_id:
-                        print("Debug: Found document without spatial data", doc_id)
-                        res.append(doc_id)
-                        res_score.append(result.score)
-            
-            # Extraer solo el número al inicio de cada línea
-            numbers = [line.split("-")[0] for line in res]
-
-            scores_str = [f"{s:.2f}" for s in res_score]
-
-            # Unirlos por comas
-            result = ",".join(numbers)
-            result_scores = ",".join(scores_str)
-
-            with open(output_file, 'a', encoding='utf-8') as output:
-                output.write(f"{query_num}\t{len(numbers)}\t{result}\t{result_scores}\n")
-            
+                        if self.verbose:
+                            print("Debug: Found document without spatial data", doc_id)
+                        res.append((doc_id, score))
         else:
-            query = self.parser.parse(query_text)
-            results = self.searcher.search(query, limit=limit)
-            for result in results:
-                with open(output_file, 'a', encoding='utf-8') as output:
-                    doc_id = result.get("path")
+            with self.stage("search"):
+                results = list(self.searcher.search(query, limit=limit).items())
+            with self.stage("stored_fields"):
+                rows = self.page_fields([docnum for docnum, _ in results], ("path",))
+                for (_, score), (doc_id,) in zip(results, rows):
                     if(doc_id):
-                        output.write(f"{doc_id}\n")
-                    else:
+                        res.append((doc_id, score))
+                    elif self.verbose:
                         print("Error: Document without dc_identifier field")
+        return res
+
+    # Consulta espacial resuelta con el R-tree: los candidatos ya intersectan con
+    # la caja, así que no hace falta leer sus coordenadas ni filtrar con intersect.
+    # Igual que Or([espacial, texto]), se suman las puntuaciones de ambas partes.
+    def spatial_results(self, west, east, south, north, query, limit=100):
+        with self.stage("spatial_index"):
+            scores = dict.fromkeys(self.spatial_index.query(west, east, south, north), SPATIAL_SCORE)
+        if self.timer:
+            self.timer.count("spatial_candidates", len(scores))
+        if query is not None:
+            with self.stage("search"):
+                results = self.searcher.search(query, limit=None)
+                for docnum, score in results.items():
+                    scores[docnum] = scores.get(docnum, 0.0) + score
+        # Mismo orden que whoosh: puntuación descendente y docnum ascendente
+        with self.stage("rank"):
+            key = lambda item: (-item[1], item[0])
+            top = sorted(scores.items(), key=key) if limit is None else heapq.nsmallest(limit, scores.items(), key=key)
+        res = []
+        with self.stage("stored_fields"):
+            rows = self.page_fields([docnum for docnum, _ in top], ("path",))
+            for (_, score), (doc_id,) in zip(top, rows):
+                if(doc_id):
+                    res.append((doc_id, score))
+                elif self.verbose:
+                    print("Error: Document without dc_identifier field")
+        return res
+
+    # output es un sink de result_sink, abierto una vez para toda la ejecución
+    def search(self, query_text, output, query_num, limit=100):
+        if self.timer:
+            self.timer.begin(query_num, query_text)
+        res = self.query_results(query_text, limit)
+        with self.stage("output"):
+            output.write(query_num, res, spatial=self.is_spatial(query_text))
+        if self.timer:
+            self.timer.end()
+
+# Un MySearcher por proceso del pool, creado una sola vez por init_search_worker
+WORKER_SEARCHER = None
+
+def init_search_worker(index_folder, model_type, options):
+    global WORKER_SEARCHER
+    WORKER_SEARCHER = MySearcher(index_folder, model_type, verbose=False, **options)
+
+def search_task(task):
+    query_text, limit = task
+    return WORKER_SEARCHER.query_results(query_text, limit), WORKER_SEARCHER.is_spatial(query_text)
+
+def search_parallel(index_folder, queries, output, workers, model_type='tfidf', limit=100, chunksize=8, **options):
+    # imap devuelve los resultados en el orden de las consultas, así que se escriben
+    # según llegan con la misma numeración que la ejecución en serie
+    from multiprocessing import Pool
+    tasks = [(query_text, limit) for query_text in queries]
+    with Pool(workers, initializer=init_search_worker, initargs=(index_folder, model_type, options)) as pool:
+        for query_num, (res, spatial) in enumerate(pool.imap(search_task, tasks, chunksize=chunksize), start=1):
+            output.write(query_num, res, spatial=spatial)
 
 
 if __name__ == '__main__':
     index_folder = '../index'
     info_PATH = None
     output_PATH = '../result.txt'
+    output_format = 'tsv'
+    query_num_column = False
+    cache_PATH = None
+    timings_PATH = None
+    profile = False
+    workers = 1
+    model_type = 'tfidf'
+    # Opciones de ranking de MySearcher: field_boosts, B, K1 y field_B
+    ranking = {}
     i = 1
     while (i < len(sys.argv)):
         if sys.argv[i] == '-index':
@@ -107,22 +320,76 @@ if __name__ == '__main__':
         if(sys.argv[i] == '-output'):
             output_PATH = sys.argv[i+1]
             i = i + 1
+        if(sys.argv[i] == '-format'):
+            output_format = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-queryNumColumn'):
+            query_num_column = True
+        if(sys.argv[i] == '-cache'):
+            cache_PATH = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-timings'):
+            timings_PATH = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-profile'):
+            profile = True
+        if(sys.argv[i] == '-workers'):
+            workers = int(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-model'):
+            model_type = sys.argv[i+1]
+            i = i + 1
+        if(sys.argv[i] == '-boosts'):
+            ranking['field_boosts'] = parse_field_values(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-B'):
+            ranking['B'] = float(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-K1'):
+            ranking['K1'] = float(sys.argv[i+1])
+            i = i + 1
+        if(sys.argv[i] == '-fieldB'):
+            ranking['field_B'] = parse_field_values(sys.argv[i+1])
+            i = i + 1
         i = i + 1
 
-    searcher = MySearcher(index_folder)
+    timer = StageTimer(timings_PATH) if timings_PATH else None
+    # Con -workers cada proceso del pool abre su propio MySearcher
+    parallel = info_PATH is not None and workers > 1
+    searcher = None if parallel else MySearcher(index_folder, model_type, timer=timer, **ranking)
+    if cache_PATH and searcher is not None and searcher.cache is not None:
+        searcher.cache.load(cache_PATH)
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
 
     if info_PATH:
-        with open(info_PATH, 'r', encoding='utf-8') as f, open(output_PATH, 'w', encoding='utf-8') as out:
-            query_num = 1
-            for line in f:
-                query = line.strip()
-                
-                if(query):
-                    searcher.search(query, output_file=output_PATH, query_num=query_num)
-                    query_num += 1
+        with open(info_PATH, 'r', encoding='utf-8') as f, open_result_sink(output_PATH, output_format, query_num_column=query_num_column) as out:
+            queries = [line.strip() for line in f if line.strip()]
+            if parallel:
+                search_parallel(index_folder, queries, out, workers, model_type, **ranking)
+            else:
+                for query_num, query in enumerate(queries, start=1):
+                    searcher.search(query, output=out, query_num=query_num)
 
     else:
-        query = input('Introduce a query (\'q\' for exit): ')
-        while query != 'q':
-            searcher.search(query, output_file=output_PATH, query_num=1)
-            query = input('Introduce a query (\'q\' for exit): ')
\ No newline at end of file
+        with open_result_sink(output_PATH, output_format, mode='a', query_num_column=query_num_column) as out:
+            query = input('Introduce a query (\'q\' for exit): ')
+            while query != 'q':
+                searcher.search(query, output=out, query_num=1)
+                out.flush()
+                query = input('Introduce a query (\'q\' for exit): ')
+    if profile:
+        profiler.disable()
+        profiler.dump_stats(output_PATH + '.prof')
+        import pstats
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(30)
+    if timer:
+        print(timer.summary())
+        timer.close()
+    if searcher is not None and searcher.cache is not None:
+        if searcher.cache.hits + searcher.cache.misses > 0:
+            print(searcher.cache.stats())
+        if cache_PATH:
+            searcher.cache.save(cache_PATH)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+server.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Servidor de consultas que mantiene abiertos varios MySearcher y responde en JSON, evitando
+abrir el índice y construir el parser en cada ejecución de search.py.
+Escucha en un puerto TCP local o en un socket Unix (-socket) y atiende clientes concurrentes
+con un pool de searchers. Antes de cada consulta se comprueba si hay una nueva generación del
+índice y, en ese caso, el searcher se reabre sobre ella.
+
+Usage: python server.py -index <indexPath> [-port <port>] [-socket <socketPath>] [-workers <N>] [-model <tfidf|bm25>]
+
+  GET  /search?q=<query>&limit=<N>          -> {"query": ..., "results": [{"id": ..., "score": ...}], "took_ms": ...}
+  POST /search  {"queries": [...], "limit": N} -> {"responses": [...]}
+  GET  /health
+"""
+
+import sys
+import os
+import json
+import time
+import queue
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from search import MySearcher
+
+class SearcherPool:
+    def __init__(self, index_folder, size=4, model_type='tfidf'):
+        self.searchers = queue.Queue()
+        for _ in range(size):
+            self.searchers.put(MySearcher(index_folder, model_type, verbose=False))
+
+    def search(self, query_text, limit=100):
+        searcher = self.searchers.get()
+        try:
+            searcher.refresh()
+            start = time.perf_counter()
+            res = searcher.query_results(query_text, limit)
+            took = (time.perf_counter() - start) * 1000
+        finally:
+            self.searchers.put(searcher)
+        return {"query": query_text,
+                "results": [{"id": doc_id, "score": score} for doc_id, score in res],
+                "took_ms": round(took, 3)}
+
+class SearchHandler(BaseHTTPRequestHandler):
+    pool = None
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self.send_json(200, {"status": "ok"})
+        elif url.path == '/search':
+            params = parse_qs(url.query)
+            if 'q' not in params:
+                self.send_json(400, {"error": "missing parameter q"})
+                return
+            try:
+                limit = int(params.get('limit', ['100'])[0])
+                self.send_json(200, self.pool.search(params['q'][0], limit))
+            except Exception as e:
+                self.send_json(400, {"error": str(e)})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/search':
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            limit = int(body.get('limit', 100))
+            responses = [self.pool.search(query_text, limit) for query_text in body.get('queries', [])]
+            self.send_json(200, {"responses": responses})
+        except Exception as e:
+            self.send_json(400, {"error": str(e)})
+
+    # En un socket Unix client_address es una cadena vacía
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+if __name__ == '__main__':
+    index_folder = '../whooshindex'
+    port = 8000
+    socket_PATH = None
+    workers = 4
+    model_type = 'tfidf'
+    i = 1
+    while (i < len(sys.argv)):
+        if sys.argv[i] == '-index':
+            index_folder = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-port':
+            port = int(sys.argv[i+1])
+            i = i + 1
+        elif sys.argv[i] == '-socket':
+            socket_PATH = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-workers':
+            workers = int(sys.argv[i+1])
+            i = i + 1
+        elif sys.argv[i] == '-model':
+            model_type = sys.argv[i+1]
+            i = i + 1
+        i = i + 1
+
+    SearchHandler.pool = SearcherPool(index_folder, workers, model_type)
+
+    if socket_PATH:
+        if os.path.exists(socket_PATH):
+            os.remove(socket_PATH)
+        server = ThreadingUnixHTTPServer(socket_PATH, SearchHandler)
+        print(f"Serving {index_folder} on unix socket {socket_PATH} with {workers} searchers")
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), SearchHandler)
+        print(f"Serving {index_folder} on http://127.0.0.1:{port} with {workers} searchers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_PATH and os.path.exists(socket_PATH):
+            os.remove(socket_PATH)
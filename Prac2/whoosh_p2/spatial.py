@@ -0,0 +1,134 @@
+"""
+spatial.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Índice espacial para las consultas "spatial:". Es un R-tree empaquetado con Sort-Tile-Recursive
+(STR) sobre las cajas west/east/south/north de cada documento, identificadas por su docnum de
+whoosh. Se construye al terminar la indexación y se guarda junto al índice whoosh precedido de la
+identidad del índice para la que es válido (doc_values.index_identity: la generación del TOC y los
+ids de sus segmentos, que cambian también al reconstruir con create_in). Si el índice cambia sin
+reconstruirlo, el searcher lo descarta y vuelve a usar las consultas NumericRange.
+"""
+
+import math
+import os
+import pickle
+from array import array
+
+import whoosh.index as index
+
+from doc_values import index_identity
+
+SPATIAL_INDEX_FILE = 'spatial_index.pkl'
+# Campos almacenados con la caja de cada documento, en el orden de intersect
+BOX_FIELDS = ("west", "east", "south", "north")
+NODE_CAPACITY = 16
+
+class STRTree:
+    # Cada nivel guarda las cajas de sus nodos en arrays paralelos. En las hojas
+    # (nivel 0) cada entrada es un documento; en los niveles superiores cada nodo
+    # apunta al rango [start[i], end[i]) de entradas del nivel inferior.
+    def __init__(self, boxes, docnums, capacity=NODE_CAPACITY):
+        self.capacity = capacity
+        order = self.str_order(boxes, list(range(len(boxes))))
+        self.docnums = array('i', (docnums[i] for i in order))
+        leaf = ([boxes[i][0] for i in order], [boxes[i][1] for i in order],
+                [boxes[i][2] for i in order], [boxes[i][3] for i in order])
+        self.levels = [(array('d', leaf[0]), array('d', leaf[1]), array('d', leaf[2]), array('d', leaf[3]),
+                        None, None)]
+        # Se agrupan bloques consecutivos de `capacity` entradas hasta llegar a la raíz
+        while len(self.levels[-1][0]) > 1:
+            west, east, south, north = self.levels[-1][:4]
+            n = len(west)
+            if len(self.levels) > 1:
+                # Los nodos ya vienen ordenados por STR del nivel anterior
+                node_boxes = [(west[i], east[i], south[i], north[i]) for i in range(n)]
+                order = self.str_order(node_boxes, list(range(n)))
+                self.reorder_level(order)
+                west, east, south, north = self.levels[-1][:4]
+            parent = ([], [], [], [], array('i'), array('i'))
+            for start in range(0, n, capacity):
+                end = min(start + capacity, n)
+                parent[0].append(min(west[start:end]))
+                parent[1].append(max(east[start:end]))
+                parent[2].append(min(south[start:end]))
+                parent[3].append(max(north[start:end]))
+                parent[4].append(start)
+                parent[5].append(end)
+            self.levels.append((array('d', parent[0]), array('d', parent[1]), array('d', parent[2]),
+                                array('d', parent[3]), parent[4], parent[5]))
+
+    def str_order(self, boxes, ids):
+        # Sort-Tile-Recursive: se ordena por centro en x, se parte en franjas
+        # verticales y cada franja se ordena por centro en y
+        n = len(ids)
+        if n == 0:
+            return []
+        leaves = math.ceil(n / self.capacity)
+        slice_size = self.capacity * math.ceil(math.sqrt(leaves))
+        ids = sorted(ids, key=lambda i: boxes[i][0] + boxes[i][1])
+        order = []
+        for start in range(0, n, slice_size):
+            order.extend(sorted(ids[start:start + slice_size], key=lambda i: boxes[i][2] + boxes[i][3]))
+        return order
+
+    def reorder_level(self, order):
+        # Reordena un nivel interno manteniendo el rango de hijos de cada nodo
+        level = self.levels[-1]
+        self.levels[-1] = tuple(array(column.typecode, (column[i] for i in order)) for column in level)
+
+    def query(self, west, east, south, north):
+        # Devuelve los docnum cuya caja intersecta con la de la consulta
+        # (misma condición que intersect.intersect)
+        res = []
+        if not self.docnums:
+            return res
+        top = len(self.levels) - 1
+        stack = [(top, 0, len(self.levels[top][0]))]
+        while stack:
+            level, start, end = stack.pop()
+            l_west, l_east, l_south, l_north, l_start, l_end = self.levels[level]
+            for i in range(start, end):
+                if west <= l_east[i] and east >= l_west[i] and south <= l_north[i] and north >= l_south[i]:
+                    if level == 0:
+                        res.append(self.docnums[i])
+                    else:
+                        stack.append((level - 1, l_start[i], l_end[i]))
+        return res
+
+    def __len__(self):
+        return len(self.docnums)
+
+def build_spatial_index(index_folder):
+    # Recorre los campos almacenados del índice ya confirmado, por lo que sirve
+    # igual para la indexación en serie, con -workers o incremental
+    ix = index.open_dir(index_folder)
+    boxes = []
+    docnums = []
+    with ix.reader() as reader:
+        identity = index_identity(reader)
+        for docnum, fields in reader.iter_docs():
+            box = tuple(fields.get(name) for name in BOX_FIELDS)
+            if None not in box:
+                boxes.append(box)
+                docnums.append(docnum)
+    tree = STRTree(boxes, docnums)
+    spatial_path = os.path.join(index_folder, SPATIAL_INDEX_FILE)
+    # La identidad va en un pickle aparte delante del árbol, para descartar un fichero
+    # obsoleto sin cargarlo entero
+    with open(spatial_path + '.tmp', 'wb') as f:
+        pickle.dump(identity, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(spatial_path + '.tmp', spatial_path)
+    return tree
+
+def load_spatial_index(index_folder, identity):
+    spatial_path = os.path.join(index_folder, SPATIAL_INDEX_FILE)
+    if not os.path.exists(spatial_path):
+        return None
+    with open(spatial_path, 'rb') as f:
+        # Los ficheros anteriores guardaban una tupla (generación, árbol)
+        if pickle.load(f) != identity:
+            return None
+        return pickle.load(f)
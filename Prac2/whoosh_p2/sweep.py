@@ -0,0 +1,262 @@
+"""
+sweep.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Barrido de parámetros de ranking (modelo, B y K1 de BM25F, B por campo y pesos por campo) evaluado
+con evaluation.py. Cada consulta se analiza y se resuelve contra el índice una sola vez: se guardan
+los documentos que la cumplen, las frecuencias de sus términos, las longitudes de campo, el idf y la
+longitud media de cada campo. Como ni los pesos ni B/K1 cambian qué documentos cumplen la consulta,
+cada configuración se puntúa después con numpy sobre esos datos, con las mismas fórmulas que
+scoring.TF_IDF y scoring.BM25F, sin volver a recorrer las listas de postings.
+Las consultas con nodos que no se pueden puntuar así (frases, rangos, comodines...) se ejecutan
+con whoosh en cada configuración. Las consultas espaciales de la práctica 2 no se evalúan.
+
+Cada configuración se evalúa con varios límites de resultados, para ver con qué límite mínimo se
+mantiene la calidad.
+
+Usage: python sweep.py -index <indexPath> -infoNeeds <queryFile> -qrels <qrelsFile> [-model <tfidf|bm25>]
+                       [-B <b1,b2,...>] [-K1 <k1,k2,...>] [-boost <campo=w1,w2,...>]... [-limits <10,20,...>]
+                       [-metric <MAP|P@10|nDCG@10|...>] [-top <N>] [-output <results.json>]
+"""
+
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+from whoosh import scoring
+from whoosh.searching import Searcher
+from whoosh.query import Term, And, Or, AndNot, AndMaybe, NullQuery
+
+from evaluation import Qrels, evaluate
+from search import MySearcher, DEFAULT_B, DEFAULT_K1, apply_field_boosts
+
+DEFAULT_LIMITS = (10, 20, 50, 100)
+
+class UnsupportedQuery(Exception):
+    pass
+
+# Términos que suman puntuación, con el boost acumulado desde la raíz. Las hojas de un
+# AndNot negativo no puntúan; en And, Or y AndMaybe la puntuación es la suma de los hijos
+def scoring_terms(query, boost=1.0):
+    boost *= query.boost
+    if isinstance(query, Term):
+        return [(query.fieldname, query.text, boost)]
+    if query is NullQuery:
+        return []
+    if isinstance(query, AndNot):
+        return scoring_terms(query.a, boost)
+    if isinstance(query, AndMaybe):
+        return scoring_terms(query.a, boost) + scoring_terms(query.b, boost)
+    if type(query) is And or (type(query) is Or and not query.minmatch and query.scale is None):
+        return [term for subquery in query.subqueries for term in scoring_terms(subquery, boost)]
+    raise UnsupportedQuery(repr(query))
+
+class QueryStats:
+    # Lo que necesita la puntuación de una consulta y no depende de la configuración
+    def __init__(self, searcher, query):
+        reader = searcher.reader()
+        schema = searcher.schema
+        self.docnums = np.array(sorted(query.docs(searcher)), dtype=np.int64)
+        self.terms = []
+        self.lengths = {}
+        for fieldname, text, boost in scoring_terms(query):
+            field = schema[fieldname]
+            try:
+                text = field.to_bytes(text)
+            except ValueError:
+                continue
+            tf = np.zeros(len(self.docnums), dtype=np.float64)
+            if len(self.docnums) and (fieldname, text) in reader:
+                ids, weights = [], []
+                postings = reader.postings(fieldname, text)
+                while postings.is_active():
+                    ids.append(postings.id())
+                    weights.append(postings.weight())
+                    postings.next()
+                ids = np.array(ids, dtype=np.int64)
+                positions = np.minimum(np.searchsorted(self.docnums, ids), len(self.docnums) - 1)
+                found = self.docnums[positions] == ids
+                tf[positions[found]] = np.array(weights, dtype=np.float64)[found]
+            if field.scorable and fieldname not in self.lengths:
+                self.lengths[fieldname] = np.array([reader.doc_field_length(docnum, fieldname, 1)
+                                                    for docnum in self.docnums], dtype=np.float64)
+            self.terms.append((fieldname, boost, field.scorable, searcher.idf(fieldname, text),
+                               searcher.avg_field_length(fieldname) or 1, tf))
+
+    def scores(self, config):
+        total = np.zeros(len(self.docnums), dtype=np.float64)
+        field_boosts = config.get('field_boosts') or {}
+        field_B = config.get('field_B') or {}
+        K1 = config.get('K1', DEFAULT_K1)
+        for fieldname, boost, scorable, idf, avgfl, tf in self.terms:
+            if config.get('model_type', 'tfidf') == 'tfidf':
+                score = tf * idf
+            elif not scorable:
+                score = tf
+            else:
+                B = field_B.get(fieldname, config.get('B', DEFAULT_B))
+                score = idf * ((tf * (K1 + 1)) / (tf + K1 * ((1 - B) + B * self.lengths[fieldname] / avgfl)))
+            total += boost * field_boosts.get(fieldname, 1.0) * score
+        return total
+
+    # Los limit mejores como (docnum, score), en el orden de whoosh: puntuación
+    # descendente y, a igualdad, docnum ascendente
+    def top(self, config, limit=100):
+        scores = self.scores(config)
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(int(self.docnums[i]), float(scores[i])) for i in order]
+
+def weighting_for(config):
+    if config.get('model_type', 'tfidf') == 'tfidf':
+        return scoring.TF_IDF()
+    field_B = config.get('field_B') or {}
+    return scoring.BM25F(B=config.get('B', DEFAULT_B), K1=config.get('K1', DEFAULT_K1),
+                         **{f"{fieldname}_B": value for fieldname, value in field_B.items()})
+
+class ParameterSweep:
+    # queries: lista de textos de consulta, numerados desde 1 como en search.py
+    def __init__(self, searcher, queries):
+        self.searcher = searcher.searcher
+        self.stats = {}
+        self.fallback = {}
+        self.skipped = 0
+        self.paths = {}
+        for query_num, query_text in enumerate(queries, start=1):
+            if query_text.strip().lower().startswith("spatial"):
+                self.skipped += 1
+                continue
+            query = searcher.parser.parse(query_text)
+            try:
+                self.stats[str(query_num)] = QueryStats(self.searcher, query)
+            except UnsupportedQuery:
+                self.fallback[str(query_num)] = query
+
+    def path(self, docnum):
+        doc_id = self.paths.get(docnum)
+        if doc_id is None:
+            doc_id = self.paths[docnum] = self.searcher.stored_fields(docnum).get("path")
+        return doc_id
+
+    def run(self, config, limit=100):
+        run = {query_num: [(self.path(docnum), score) for docnum, score in stats.top(config, limit)]
+               for query_num, stats in self.stats.items()}
+        if self.fallback:
+            # Searcher sobre el mismo lector, con la ponderación de la configuración
+            with Searcher(self.searcher.reader(), weighting=weighting_for(config), closereader=False) as searcher:
+                for query_num, query in self.fallback.items():
+                    results = searcher.search(apply_field_boosts(query, config.get('field_boosts') or {}), limit=limit)
+                    run[query_num] = [(result.get("path"), result.score) for result in results]
+        return run
+
+    # Evalúa cada configuración con cada límite; devuelve una lista de diccionarios
+    # con la configuración, el límite y el resumen de evaluation.evaluate
+    def sweep(self, configs, qrels, limits=DEFAULT_LIMITS):
+        results = []
+        for config in configs:
+            run = self.run(config, max(limits))
+            for limit in limits:
+                truncated = {query_num: docs[:limit] for query_num, docs in run.items()}
+                results.append({"config": config, "limit": limit, "metrics": evaluate(qrels, truncated)})
+        return results
+
+# Producto cartesiano de los valores de cada parámetro
+def config_grid(model_type='bm25', Bs=(DEFAULT_B,), K1s=(DEFAULT_K1,), boost_grid=None, field_B=None):
+    boost_grid = boost_grid or {}
+    fieldnames = sorted(boost_grid)
+    configs = []
+    if model_type == 'tfidf':
+        Bs, K1s = (DEFAULT_B,), (DEFAULT_K1,)
+    for B, K1 in itertools.product(Bs, K1s):
+        for weights in itertools.product(*(boost_grid[fieldname] for fieldname in fieldnames)):
+            config = {'model_type': model_type, 'field_boosts': dict(zip(fieldnames, weights))}
+            if model_type != 'tfidf':
+                config.update(B=B, K1=K1, field_B=field_B or {})
+            configs.append(config)
+    return configs
+
+def parse_values(text):
+    return [float(value) for value in text.split(",") if value.strip()]
+
+
+if __name__ == '__main__':
+    index_folder = '../index'
+    info_PATH = None
+    qrels_PATH = None
+    output_PATH = None
+    model_type = 'bm25'
+    Bs = [DEFAULT_B]
+    K1s = [DEFAULT_K1]
+    boost_grid = {}
+    limits = DEFAULT_LIMITS
+    metric = 'MAP'
+    top = 10
+    i = 1
+    while (i < len(sys.argv)):
+        if sys.argv[i] == '-index':
+            index_folder = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-infoNeeds':
+            info_PATH = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-qrels':
+            qrels_PATH = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-output':
+            output_PATH = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-model':
+            model_type = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-B':
+            Bs = parse_values(sys.argv[i+1])
+            i = i + 1
+        elif sys.argv[i] == '-K1':
+            K1s = parse_values(sys.argv[i+1])
+            i = i + 1
+        elif sys.argv[i] == '-boost':
+            fieldname, values = sys.argv[i+1].split("=")
+            boost_grid[fieldname] = parse_values(values)
+            i = i + 1
+        elif sys.argv[i] == '-limits':
+            limits = tuple(int(limit) for limit in sys.argv[i+1].split(","))
+            i = i + 1
+        elif sys.argv[i] == '-metric':
+            metric = sys.argv[i+1]
+            i = i + 1
+        elif sys.argv[i] == '-top':
+            top = int(sys.argv[i+1])
+            i = i + 1
+        i = i + 1
+
+    if info_PATH is None or qrels_PATH is None:
+        print(__doc__)
+        sys.exit(1)
+
+    with open(info_PATH, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+    qrels = Qrels.load(qrels_PATH)
+    configs = config_grid(model_type, Bs, K1s, boost_grid)
+
+    start = time.perf_counter()
+    sweep = ParameterSweep(MySearcher(index_folder, model_type, cache_size=0), queries)
+    print(f"Prepared {len(sweep.stats)} queries in {time.perf_counter() - start:.2f} s "
+          f"({len(sweep.fallback)} run with whoosh, {sweep.skipped} spatial skipped)")
+    start = time.perf_counter()
+    results = sweep.sweep(configs, qrels, limits)
+    print(f"Evaluated {len(configs)} configurations x {len(limits)} limits in {time.perf_counter() - start:.2f} s")
+
+    results.sort(key=lambda result: result["metrics"][metric], reverse=True)
+    print(f"\nTop {top} by {metric}:")
+    for result in results[:top]:
+        print(f"{result['metrics'][metric]:.4f}\tlimit={result['limit']}\t{json.dumps(result['config'])}")
+    print(f"\nBest {metric} per limit:")
+    for limit in limits:
+        best = max((result for result in results if result["limit"] == limit), key=lambda result: result["metrics"][metric])
+        print(f"limit={limit}\t{best['metrics'][metric]:.4f}\t{json.dumps(best['config'])}")
+
+    if output_PATH:
+        with open(output_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
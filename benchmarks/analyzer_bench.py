@@ -0,0 +1,120 @@
+"""
+analyzer_bench.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Micro-benchmark de los analizadores de whoosh_p1/whoosh_p2: la cadena de CustomAnalyzer
+(RegexTokenizer | LowercaseFilter | StopFilter | SnowballStemFilter) frente a BatchAnalyzer.
+Los valores de los campos salen de los XML de -docs o, si no se indica, del corpus sintético de
+corpus.py mezclado con palabras vacías, mayúsculas y puntuación, como en los textos reales.
+Antes de medir se comprueba que los dos analizadores producen exactamente los mismos tokens
+(texto, posición y offsets). Cada analizador se mide con la caché de raíces vacía (primera pasada)
+y llena (resto de pasadas), consumiendo los tokens como lo hace whoosh al indexar.
+
+Usage: python analyzer_bench.py [-docs <docsFolder>] [-n <numValues>] [-repeat <N>] [-seed <seed>]
+"""
+
+import os
+import random
+import sys
+import time
+
+from corpus import SyntheticCorpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Prac1', 'whoosh_p1'))
+
+from whoosh.lang import stopwords_for_language
+
+from analyzer import CustomAnalyzer
+from dublin_core import iter_records
+
+PUNCTUATION = [",", ".", ";", ":", "", "", "", ""]
+
+def synthetic_values(num_values, seed=0):
+    # Una de cada tres palabras es vacía, como en un texto en castellano
+    rng = random.Random(seed)
+    corpus = SyntheticCorpus(seed)
+    stops = sorted(stopwords_for_language("es"))
+    values = []
+    for _ in range(num_values):
+        words = []
+        for word in corpus.words(rng, rng.randint(5, 200)):
+            if rng.random() < 0.1:
+                word = word.capitalize()
+            words.append(word + rng.choice(PUNCTUATION))
+            if rng.random() < 0.5:
+                words.append(rng.choice(stops))
+        values.append(" ".join(words))
+    return values
+
+def docs_values(docs_folder, num_values):
+    values = []
+    for file in sorted(os.listdir(docs_folder)):
+        if not file.endswith('.xml'):
+            continue
+        for record in iter_records(os.path.join(docs_folder, file)):
+            for name, texts in record.items():
+                if name not in ('identifier', 'date', 'LowerCorner', 'UpperCorner'):
+                    values.extend(text for text in texts if text)
+        if len(values) >= num_values:
+            break
+    return values[:num_values]
+
+def token_stream(analyzer, value, **kwargs):
+    return [(t.text, t.pos, t.startchar, t.endchar) for t in analyzer(value, positions=True, chars=True, **kwargs)]
+
+def check_identical(values):
+    chain, batch = CustomAnalyzer(), CustomAnalyzer(batch=True)
+    for value in values:
+        for removestops in (True, False):
+            if token_stream(chain, value, removestops=removestops) != token_stream(batch, value, removestops=removestops):
+                raise AssertionError(f"Different tokens for {value!r}")
+
+def time_analyzer(analyzer, values):
+    # Mismos argumentos que TEXT.index: posiciones y modo 'index'
+    tokens = 0
+    start = time.perf_counter()
+    for value in values:
+        for t in analyzer(value, positions=True, mode='index'):
+            t.text
+            t.pos
+            tokens += 1
+    return tokens, time.perf_counter() - start
+
+def bench(name, analyzer, values, repeat):
+    tokens, cold = time_analyzer(analyzer, values)
+    warm = min(time_analyzer(analyzer, values)[1] for _ in range(repeat))
+    print(f"{name:8} {tokens:>10} {tokens / cold:>14.0f} {tokens / warm:>14.0f}")
+    return tokens / warm
+
+
+if __name__ == '__main__':
+    docs_folder = None
+    num_values = 5000
+    repeat = 3
+    seed = 0
+    i = 1
+    while i < len(sys.argv):
+        if sys.argv[i] == '-docs':
+            docs_folder = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-n':
+            num_values = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-repeat':
+            repeat = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-seed':
+            seed = int(sys.argv[i + 1])
+            i = i + 1
+        i = i + 1
+
+    values = docs_values(docs_folder, num_values) if docs_folder else synthetic_values(num_values, seed)
+    print(f"{len(values)} field values, {sum(len(value) for value in values)} characters")
+    check_identical(values)
+    print("Both analyzers produce identical tokens")
+    print(f"{'analyzer':8} {'tokens':>10} {'cold tok/s':>14} {'warm tok/s':>14}")
+    chain_rate = bench('chain', CustomAnalyzer(), values, repeat)
+    batch_rate = bench('batch', CustomAnalyzer(batch=True), values, repeat)
+    print(f"Speedup (warm): {batch_rate / chain_rate:.2f}x")
@@ -0,0 +1,258 @@
+"""
+bench.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Banco de pruebas de indexación y búsqueda para whoosh_p1, whoosh_p2 y gensim_demo sobre un corpus
+sintético (ver corpus.py). Para cada programa se mide:
+  index  -> segundos, documentos por segundo, pico de memoria (RSS) y tamaño del índice en disco
+  search -> latencia por consulta (media, p50, p95, p99), consultas por segundo y pico de RSS
+
+Cada fase se ejecuta en un proceso aparte, así el pico de RSS es el de esa fase y los módulos
+index.py/search.py de cada práctica (que se llaman igual) no se mezclan. Los resultados se guardan
+en JSON junto con el commit, para compararlos con los de otro commit mediante -compare.
+
+Usage: python bench.py [-n <numDocs>] [-queries <numQueries>] [-seed <seed>] [-targets <p1,p2,gensim>]
+                       [-work <workFolder>] [-output <results.json>] [-compare <oldResults.json>]
+"""
+
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from corpus import SyntheticCorpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = {
+    'p1': os.path.join(ROOT, 'Prac1', 'whoosh_p1'),
+    'p2': os.path.join(ROOT, 'Prac2', 'whoosh_p2'),
+    'gensim': os.path.join(ROOT, 'Prac1'),
+}
+WARMUP_QUERIES = 10
+
+def percentile(values, p):
+    # Percentil por el método del rango más cercano sobre la lista ordenada
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def folder_size(folder):
+    size = 0
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return size
+
+def peak_rss_mb():
+    # ru_maxrss está en KiB en Linux; se incluyen los procesos hijos (pools de -workers)
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(rss / 1024, 1)
+
+def latency_stats(latencies, total_seconds):
+    latencies = sorted(latencies)
+    return {"queries": len(latencies),
+            "mean_ms": round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50_ms": round(1000 * percentile(latencies, 50), 3),
+            "p95_ms": round(1000 * percentile(latencies, 95), 3),
+            "p99_ms": round(1000 * percentile(latencies, 99), 3),
+            "queries_per_sec": round(len(latencies) / total_seconds, 1) if total_seconds else 0.0}
+
+def time_queries(run, queries):
+    for query in queries[:WARMUP_QUERIES]:
+        run(query)
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        run(query)
+        latencies.append(time.perf_counter() - query_start)
+    return latencies, time.perf_counter() - start
+
+# Fases que se ejecutan en el proceso hijo, con el directorio de la práctica en sys.path
+
+def index_phase(target, docs_folder, index_folder, num_docs):
+    shutil.rmtree(index_folder, ignore_errors=True)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        if target == 'gensim':
+            from gensim_demo import index
+            index.LANGUAGE = 'spanish'
+            index.create_folder(index_folder)
+            index.create_index(index_folder, docs_folder)
+        else:
+            import index
+            index.MyIndex(index_folder).index_docs(docs_folder)
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3),
+            "docs_per_sec": round(num_docs / seconds, 1),
+            "peak_rss_mb": peak_rss_mb(),
+            "index_size_mb": round(folder_size(index_folder) / 2**20, 2)}
+
+def search_phase(target, index_folder, queries):
+    if target == 'gensim':
+        from gensim_demo import index
+        from gensim_demo import search
+        index.LANGUAGE = 'spanish'
+        searcher = search.GensimSearcher(index_folder)
+        latencies, seconds = time_queries(searcher.search, queries)
+        stats = latency_stats(latencies, seconds)
+        # Además, todas las consultas en un único producto de matrices
+        start = time.perf_counter()
+        searcher.search_batch(queries)
+        stats["batch_queries_per_sec"] = round(len(queries) / (time.perf_counter() - start), 1)
+    else:
+        import search
+        # Sin caché de resultados, para medir el coste real de cada consulta
+        options = {'verbose': False} if target == 'p2' else {}
+        searcher = search.MySearcher(index_folder, cache_size=0, **options)
+        latencies, seconds = time_queries(searcher.query_results, queries)
+        stats = latency_stats(latencies, seconds)
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return stats
+
+def run_phase(phase, target, work_folder, num_docs, queries_file):
+    # Lanza una fase en un proceso nuevo y devuelve su diccionario de resultados
+    result_file = os.path.join(work_folder, f"{target}.{phase}.json")
+    subprocess.run([sys.executable, os.path.abspath(__file__), '-phase', phase, '-target', target,
+                    '-work', work_folder, '-n', str(num_docs), '-queryFile', queries_file,
+                    '-result', result_file], check=True)
+    with open(result_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new):
+    # Imprime cada métrica de los dos ficheros y su variación porcentual
+    print(f"{'metric':40} {old.get('commit')!s:>12} {new.get('commit')!s:>12} {'change':>9}")
+    for target, phases in new['results'].items():
+        for phase, metrics in phases.items():
+            old_metrics = old['results'].get(target, {}).get(phase, {})
+            for metric, value in metrics.items():
+                old_value = old_metrics.get(metric)
+                change = f"{100 * (value - old_value) / old_value:+.1f}%" if old_value else ""
+                print(f"{target + '.' + phase + '.' + metric:40} {old_value!s:>12} {value!s:>12} {change:>9}")
+
+def run_benchmark(targets, num_docs, num_queries, seed, work_folder):
+    corpus = SyntheticCorpus(seed)
+    docs_folder = os.path.join(work_folder, 'docs')
+    shutil.rmtree(docs_folder, ignore_errors=True)
+    print(f"Generating {num_docs} documents in {docs_folder}")
+    corpus.write_docs(docs_folder, num_docs, spatial=True)
+    query_sets = {'p1': corpus.field_queries(num_queries),
+                  'p2': corpus.field_queries(num_queries, spatial=True),
+                  'gensim': corpus.text_queries(num_queries)}
+    results = {}
+    for target in targets:
+        queries_file = os.path.join(work_folder, f"{target}.queries.json")
+        with open(queries_file, 'w', encoding='utf-8') as f:
+            json.dump(query_sets[target], f, ensure_ascii=False)
+        print(f"[{target}] indexing")
+        results[target] = {"index": run_phase('index', target, work_folder, num_docs, queries_file)}
+        print(f"[{target}] searching")
+        results[target]["search"] = run_phase('search', target, work_folder, num_docs, queries_file)
+        print(f"[{target}] {json.dumps(results[target])}")
+    return {"commit": git_commit(),
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {"docs": num_docs, "queries": num_queries, "seed": seed},
+            "results": results}
+
+
+if __name__ == '__main__':
+    num_docs = 2000
+    num_queries = 500
+    seed = 0
+    targets = list(TARGETS)
+    work_folder = None
+    output_PATH = 'bench_results.json'
+    compare_PATH = None
+    phase = None
+    target = None
+    queries_PATH = None
+    result_PATH = None
+    i = 1
+    while i < len(sys.argv):
+        if sys.argv[i] == '-n':
+            num_docs = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-queries':
+            num_queries = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-seed':
+            seed = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-targets':
+            targets = sys.argv[i + 1].split(',')
+            i = i + 1
+        elif sys.argv[i] == '-work':
+            work_folder = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-output':
+            output_PATH = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-compare':
+            compare_PATH = sys.argv[i + 1]
+            i = i + 1
+        # Opciones internas de los procesos hijos
+        elif sys.argv[i] == '-phase':
+            phase = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-target':
+            target = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-queryFile':
+            queries_PATH = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-result':
+            result_PATH = sys.argv[i + 1]
+            i = i + 1
+        i = i + 1
+
+    if phase:
+        sys.path.insert(0, TARGETS[target])
+        index_folder = os.path.join(work_folder, f"{target}_index")
+        if phase == 'index':
+            result = index_phase(target, os.path.join(work_folder, 'docs'), index_folder, num_docs)
+        else:
+            with open(queries_PATH, 'r', encoding='utf-8') as f:
+                result = search_phase(target, index_folder, json.load(f))
+        with open(result_PATH, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        sys.exit(0)
+
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        print(f"Unknown targets: {', '.join(unknown)}; expected some of {', '.join(TARGETS)}")
+        sys.exit(1)
+    # Con -work se conservan el corpus y los índices para examinarlos después
+    keep_work = work_folder is not None
+    if work_folder is None:
+        work_folder = tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(work_folder, exist_ok=True)
+    try:
+        report = run_benchmark(targets, num_docs, num_queries, seed, work_folder)
+    finally:
+        if not keep_work:
+            shutil.rmtree(work_folder)
+    with open(output_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved in {output_PATH}")
+    if compare_PATH:
+        with open(compare_PATH, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
@@ -0,0 +1,125 @@
+"""
+corpus.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Generador de un corpus sintético de documentos Dublin Core en XML, con el mismo formato que los
+de las prácticas (dc:identifier, creator, contributor, publisher, title, description, subject, date
+y ows:BoundingBox), y de las consultas con las que se mide la búsqueda. Con la misma semilla se
+obtienen siempre los mismos documentos y consultas, para poder comparar ejecuciones.
+
+Usage: python corpus.py -docs <docFolder> [-n <numDocs>] [-seed <seed>] [-nospatial]
+"""
+
+import os
+import random
+import sys
+
+SYLLABLES = ["ca", "ma", "ri", "to", "lo", "ne", "sa", "de", "mi", "ta", "ción", "go", "re", "li", "nu",
+             "te", "bo", "ra", "si", "po", "mu", "la", "dí", "an", "es", "ur", "ve", "zo", "ja", "fe"]
+NAMES = ["Lázaro", "Cristina", "Nicolás", "María", "Javier", "Lucía", "Jorge", "Ana", "Pablo", "Elena",
+         "Carlos", "Sofía", "Miguel", "Laura", "David", "Marta", "Sergio", "Paula", "Raúl", "Irene"]
+DEPARTMENTS = ["Derecho", "Medicina", "Informática", "Física", "Química", "Historia", "Geografía",
+               "Matemáticas", "Economía", "Biología"]
+VOCABULARY_SIZE = 2000
+
+def make_vocabulary(rng, size=VOCABULARY_SIZE):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+class SyntheticCorpus:
+    # Las palabras siguen una distribución de Zipf (peso 1/rango) para que haya
+    # términos muy frecuentes y una cola larga de términos raros, como en texto real
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.vocabulary = make_vocabulary(random.Random(seed))
+        self.weights = [1.0 / rank for rank in range(1, len(self.vocabulary) + 1)]
+
+    def words(self, rng, k):
+        return rng.choices(self.vocabulary, weights=self.weights, k=k)
+
+    def xml_doc(self, rng, doc_no, spatial=True):
+        subjects = ''.join(f"<dc:subject>{word}</dc:subject>\n" for word in self.words(rng, rng.randint(1, 3)))
+        bounding_box = ""
+        if spatial:
+            # LowerCorner "west south" y UpperCorner "east north", como en los documentos de la práctica 2
+            west = rng.uniform(-180.0, 170.0)
+            south = rng.uniform(-90.0, 80.0)
+            east = west + rng.uniform(0.1, 10.0)
+            north = south + rng.uniform(0.1, 10.0)
+            bounding_box = (f"<ows:BoundingBox><ows:LowerCorner>{west:.4f} {south:.4f}</ows:LowerCorner>"
+                            f"<ows:UpperCorner>{east:.4f} {north:.4f}</ows:UpperCorner></ows:BoundingBox>\n")
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" '
+                f'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:ows="http://www.opengis.net/ows">\n'
+                f"<dc:identifier>{doc_no}-http://zaguan.unizar.es/record/{doc_no}</dc:identifier>\n"
+                f"<dc:creator>{rng.choice(NAMES)} {rng.choice(self.vocabulary).capitalize()}</dc:creator>\n"
+                f"<dc:contributor>{rng.choice(NAMES)} {rng.choice(self.vocabulary).capitalize()}</dc:contributor>\n"
+                f"<dc:publisher>Departamento de {rng.choice(DEPARTMENTS)}</dc:publisher>\n"
+                f"<dc:title>{' '.join(self.words(rng, rng.randint(4, 12)))}</dc:title>\n"
+                f"<dc:description>{' '.join(self.words(rng, rng.randint(60, 250)))}</dc:description>\n"
+                f"{subjects}"
+                f"<dc:date>{rng.randint(1990, 2025)}</dc:date>\n"
+                f"{bounding_box}"
+                f"</oai_dc:dc>\n")
+
+    def write_docs(self, docs_folder, num_docs, spatial=True):
+        if not os.path.exists(docs_folder):
+            os.makedirs(docs_folder)
+        rng = random.Random(self.seed)
+        for doc_no in range(num_docs):
+            with open(os.path.join(docs_folder, f"{doc_no:07d}.xml"), 'w', encoding='utf-8') as f:
+                f.write(self.xml_doc(rng, doc_no, spatial))
+
+    # Consultas de campos al estilo de consultas.txt; con spatial, una de cada
+    # cuatro es "spatial:west,east,south,north" con o sin parte de texto
+    def field_queries(self, num_queries, spatial=False):
+        rng = random.Random(self.seed + 1)
+        queries = []
+        for _ in range(num_queries):
+            clauses = [f"titulo:{word}" for word in self.words(rng, rng.randint(1, 2))]
+            if rng.random() < 0.5:
+                clauses.append(f"descripcion:{self.words(rng, 1)[0]}")
+            if rng.random() < 0.3:
+                clauses.append(f"autor:{rng.choice(NAMES)}")
+            if rng.random() < 0.3:
+                clauses.append(f"anyo:{rng.randint(1990, 2025)}")
+            query = ' AND '.join(clauses) if rng.random() < 0.5 else ' '.join(clauses)
+            if spatial and rng.random() < 0.25:
+                west = rng.uniform(-180.0, 150.0)
+                south = rng.uniform(-90.0, 60.0)
+                box = f"spatial:{west:.1f},{west + rng.uniform(5.0, 30.0):.1f},{south:.1f},{south + rng.uniform(5.0, 30.0):.1f}"
+                # search.py solo toma el primer término tras la caja
+                query = box if rng.random() < 0.5 else f"{box} titulo:{self.words(rng, 1)[0]}"
+            queries.append(query)
+        return queries
+
+    # Consultas de texto libre para gensim
+    def text_queries(self, num_queries):
+        rng = random.Random(self.seed + 2)
+        return [' '.join(self.words(rng, rng.randint(1, 4))) for _ in range(num_queries)]
+
+
+if __name__ == '__main__':
+    docs_folder = 'docs'
+    num_docs = 1000
+    seed = 0
+    spatial = True
+    i = 1
+    while i < len(sys.argv):
+        if sys.argv[i] == '-docs':
+            docs_folder = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-n':
+            num_docs = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-seed':
+            seed = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-nospatial':
+            spatial = False
+        i = i + 1
+
+    SyntheticCorpus(seed).write_docs(docs_folder, num_docs, spatial)
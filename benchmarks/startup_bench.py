@@ -0,0 +1,199 @@
+"""
+startup_bench.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Banco de pruebas del arranque en frío de search.py en whoosh_p1 y whoosh_p2: lo que tarda una
+ejecución que responde a unas pocas consultas, dominada por las importaciones. Para cada práctica
+se indexa un corpus sintético pequeño (corpus.py) y se mide, con el mejor de -runs procesos nuevos:
+  import_search_ms -> tiempo de "import search" según python -X importtime
+  import_ms        -> tiempo total de importación de una ejecución completa de search.py
+  wall_ms          -> tiempo de reloj de esa ejecución, arranque del intérprete incluido
+  modules          -> número de módulos importados en esa ejecución
+Además se comprueba que no se cargan los módulos que solo hacen falta en otros caminos (nltk y
+scipy, numpy, multiprocessing.pool, cProfile, pstats); si alguno aparece se indica quién lo importa.
+
+Con -compare se compara con un JSON anterior y el programa termina con código 1 si alguna métrica
+empeora más de -tolerance por ciento o si se carga algún módulo perezoso, para usarlo como
+comprobación de que el arranque no empeora.
+
+Usage: python startup_bench.py [-runs <N>] [-n <numDocs>] [-queries <numQueries>] [-targets <p1,p2>]
+                               [-work <workFolder>] [-output <results.json>] [-compare <old.json>]
+                               [-tolerance <percent>]
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench import TARGETS, git_commit
+from corpus import SyntheticCorpus
+
+LAZY_MODULES = ('nltk', 'scipy', 'numpy', 'multiprocessing.pool', 'cProfile', 'pstats')
+STARTUP_TARGETS = ('p1', 'p2')
+
+def parse_importtime(stderr):
+    # Líneas "import time: self | cumulative | name"; la sangría del nombre indica la
+    # profundidad. Devuelve [(nombre, profundidad, acumulado en µs)] en orden de aparición
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(cumulative)))
+    return imports
+
+def importers(imports, module):
+    # Cadena de módulos de nivel superior a module, para saber quién lo ha importado.
+    # importtime escribe cada módulo al terminar su importación, después de sus hijos
+    for position, (name, depth, _) in enumerate(imports):
+        if name == module:
+            chain = [name]
+            for parent, parent_depth, _ in imports[position + 1:]:
+                if parent_depth < depth:
+                    chain.append(parent)
+                    depth = parent_depth
+            return " <- ".join(chain)
+    return None
+
+def run_importtime(args, cwd):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd, capture_output=True,
+                            text=True, check=True)
+    return time.perf_counter() - start, parse_importtime(result.stderr)
+
+def measure(target, index_folder, queries_file, output_file, runs):
+    cwd = TARGETS[target]
+    import_search = min(dict((name, cumulative) for name, depth, cumulative in
+                             run_importtime(['-c', 'import search'], cwd)[1] if depth == 0)['search']
+                        for _ in range(runs))
+    best = None
+    for _ in range(runs):
+        wall, imports = run_importtime(['search.py', '-index', index_folder, '-infoNeeds', queries_file,
+                                        '-output', output_file], cwd)
+        if best is None or wall < best[0]:
+            best = (wall, imports)
+    wall, imports = best
+    loaded = {name for name, _, _ in imports}
+    lazy = {module: importers(imports, module) for module in LAZY_MODULES if module in loaded}
+    return {"import_search_ms": round(import_search / 1000, 1),
+            "import_ms": round(sum(cumulative for _, depth, cumulative in imports if depth == 0) / 1000, 1),
+            "wall_ms": round(1000 * wall, 1),
+            "modules": len(imports),
+            "lazy_modules_loaded": lazy}
+
+def prepare(target, work_folder, num_docs, num_queries, corpus):
+    # Índice construido con el index.py actual, para que el esquema guardado sea el de este commit
+    docs_folder = os.path.join(work_folder, 'docs')
+    index_folder = os.path.join(work_folder, f"{target}_index")
+    shutil.rmtree(index_folder, ignore_errors=True)
+    subprocess.run([sys.executable, 'index.py', '-index', index_folder, '-docs', docs_folder],
+                   cwd=TARGETS[target], stdout=subprocess.DEVNULL, check=True)
+    queries_file = os.path.join(work_folder, f"{target}.queries.txt")
+    with open(queries_file, 'w', encoding='utf-8') as f:
+        f.write("\n".join(corpus.field_queries(num_queries, spatial=(target == 'p2'))) + "\n")
+    return index_folder, queries_file
+
+def run_benchmark(targets, num_docs, num_queries, runs, seed, work_folder):
+    corpus = SyntheticCorpus(seed)
+    docs_folder = os.path.join(work_folder, 'docs')
+    shutil.rmtree(docs_folder, ignore_errors=True)
+    corpus.write_docs(docs_folder, num_docs, spatial=True)
+    results = {}
+    for target in targets:
+        index_folder, queries_file = prepare(target, work_folder, num_docs, num_queries, corpus)
+        results[target] = {"startup": measure(target, index_folder, queries_file,
+                                              os.path.join(work_folder, f"{target}.result.txt"), runs)}
+        print(f"[{target}] {json.dumps(results[target])}")
+    return {"commit": git_commit(),
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": sys.version.split()[0],
+            "config": {"docs": num_docs, "queries": num_queries, "runs": runs, "seed": seed},
+            "results": results}
+
+def regressions(old, new, tolerance):
+    # Métricas numéricas que empeoran más de tolerance por ciento y módulos perezosos cargados
+    problems = []
+    for target, phases in new['results'].items():
+        startup = phases['startup']
+        for module, chain in startup['lazy_modules_loaded'].items():
+            problems.append(f"{target}: {module} loaded at startup ({chain})")
+        old_startup = old['results'].get(target, {}).get('startup', {}) if old else {}
+        for metric, value in startup.items():
+            old_value = old_startup.get(metric)
+            if isinstance(value, (int, float)) and old_value and value > old_value * (1 + tolerance / 100):
+                problems.append(f"{target}: {metric} {old_value} -> {value} "
+                                f"({100 * (value - old_value) / old_value:+.1f}%)")
+    return problems
+
+
+if __name__ == '__main__':
+    runs = 5
+    num_docs = 200
+    num_queries = 3
+    seed = 0
+    targets = list(STARTUP_TARGETS)
+    work_folder = None
+    output_PATH = 'startup_results.json'
+    compare_PATH = None
+    tolerance = 25.0
+    i = 1
+    while i < len(sys.argv):
+        if sys.argv[i] == '-runs':
+            runs = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-n':
+            num_docs = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-queries':
+            num_queries = int(sys.argv[i + 1])
+            i = i + 1
+        elif sys.argv[i] == '-targets':
+            targets = sys.argv[i + 1].split(',')
+            i = i + 1
+        elif sys.argv[i] == '-work':
+            work_folder = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-output':
+            output_PATH = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-compare':
+            compare_PATH = sys.argv[i + 1]
+            i = i + 1
+        elif sys.argv[i] == '-tolerance':
+            tolerance = float(sys.argv[i + 1])
+            i = i + 1
+        i = i + 1
+
+    unknown = [t for t in targets if t not in STARTUP_TARGETS]
+    if unknown:
+        print(f"Unknown targets: {', '.join(unknown)}; expected some of {', '.join(STARTUP_TARGETS)}")
+        sys.exit(1)
+    # Con -work se conservan el corpus y los índices, igual que en bench.py
+    keep_work = work_folder is not None
+    if work_folder is None:
+        work_folder = tempfile.mkdtemp(prefix='startup_')
+    os.makedirs(work_folder, exist_ok=True)
+    try:
+        report = run_benchmark(targets, num_docs, num_queries, runs, seed, work_folder)
+    finally:
+        if not keep_work:
+            shutil.rmtree(work_folder)
+    with open(output_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved in {output_PATH}")
+
+    old = None
+    if compare_PATH:
+        with open(compare_PATH, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    problems = regressions(old, report, tolerance)
+    for problem in problems:
+        print("REGRESSION " + problem)
+    sys.exit(1 if problems else 0)
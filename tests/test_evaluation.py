@@ -0,0 +1,58 @@
+"""
+test_evaluation.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+Identificadores de documento en evaluation.py: solo los "N-url" de la práctica 2 se reducen a N;
+los identificadores con '-' de los qrels no deben confundirse entre sí.
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EVALUATION_FILES = {
+    'p1': os.path.join(ROOT, 'Prac1', 'whoosh_p1', 'evaluation.py'),
+    'p2': os.path.join(ROOT, 'Prac2', 'whoosh_p2', 'evaluation.py'),
+}
+
+# Los módulos de las dos prácticas se llaman igual, así que se cargan con nombres distintos
+def load_evaluation(target):
+    spec = importlib.util.spec_from_file_location(f"evaluation_{target}", EVALUATION_FILES[target])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(params=sorted(EVALUATION_FILES))
+def evaluation(request):
+    return load_evaluation(request.param)
+
+def test_normalize_doc_id(evaluation):
+    assert evaluation.normalize_doc_id("1683-http://zaguan.unizar.es/record/1683\n") == "1683"
+    assert evaluation.normalize_doc_id(" 1683 ") == "1683"
+    assert evaluation.normalize_doc_id("oai:zaguan.unizar.es:TAZ-TFG-2014-100") == "oai:zaguan.unizar.es:TAZ-TFG-2014-100"
+    assert evaluation.normalize_doc_id("TAZ-TFG-2014-100") != evaluation.normalize_doc_id("TAZ-TFG-2014-101")
+
+def test_hyphenated_qrels_ids(evaluation, tmp_path):
+    qrels_file = tmp_path / "qrels.txt"
+    qrels_file.write_text("1 TAZ-TFG-2014-100 1\n1 TAZ-PFC-2012-7 0\n", encoding='utf-8')
+    qrels = evaluation.Qrels.load(str(qrels_file))
+    assert qrels.judgments == {"1": {"TAZ-TFG-2014-100": 1}}
+
+    # Un identificador que comparte el prefijo anterior al '-' no es relevante
+    summary = evaluation.evaluate(qrels, {"1": ["TAZ-PFC-2012-7", "TAZ-TFG-2014-100"]}, k_values=(1, 2))
+    assert summary["P@1"] == 0.0
+    assert summary["P@2"] == 0.5
+    assert summary["MAP"] == 0.5
+
+def test_spatial_ids_match_numeric_qrels(evaluation, tmp_path):
+    qrels_file = tmp_path / "qrels.txt"
+    qrels_file.write_text("1 12 1\n1 13 1\n", encoding='utf-8')
+    results_file = tmp_path / "results.txt"
+    results_file.write_text("1\t2\t12,99\t4.00,4.00\n", encoding='utf-8')
+    run = evaluation.load_run(str(results_file))
+    assert run == {"1": ["12", "99"]}
+    summary = evaluation.evaluate(evaluation.Qrels.load(str(qrels_file)), run, k_values=(1,))
+    assert summary["P@1"] == 1.0
@@ -0,0 +1,75 @@
+"""
+test_incremental.py
+Author: Jorge Pagan Saiz and Jiahao Ye
+Last update: 2026-10-18
+
+index.py -incremental sobre un índice creado antes de -incremental (path sin unique y sin
+manifiesto, como los whooshindex del repositorio): debe reconstruirse en lugar de duplicar los
+documentos. Cada práctica se ejecuta en un proceso aparte porque sus módulos se llaman igual.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench import TARGETS
+from corpus import SyntheticCorpus
+
+NUM_DOCS = 30
+
+# Índice con el esquema anterior: el de MyIndex con path=ID(stored=True) sin unique
+LEGACY_INDEX = """
+import os
+import sys
+from whoosh.index import create_in
+from whoosh.fields import ID
+from index import MyIndex
+
+index_folder, docs_folder = sys.argv[1:3]
+my_index = MyIndex(index_folder)
+my_index.writer.cancel()
+schema = my_index.writer.schema
+schema._fields['path'] = ID(stored=True)
+writer = create_in(index_folder, schema).writer()
+for file in sorted(os.listdir(docs_folder)):
+    for fields in MyIndex.parse_xml_docs(docs_folder, file):
+        writer.add_document(**fields)
+writer.commit()
+os.remove(os.path.join(index_folder, 'manifest.json'))
+"""
+
+COUNT_DOCS = """
+import sys
+from whoosh.index import open_dir
+
+with open_dir(sys.argv[1]).reader() as reader:
+    paths = [fields['path'] for _, fields in reader.iter_docs()]
+print(len(paths), len(set(paths)))
+"""
+
+def run(target, *args):
+    result = subprocess.run([sys.executable] + list(args), cwd=TARGETS[target], capture_output=True,
+                            text=True, check=True)
+    return result.stdout
+
+@pytest.mark.parametrize('target', ['p1', 'p2'])
+def test_incremental_rebuilds_legacy_index(target, tmp_path):
+    docs_folder = str(tmp_path / 'docs')
+    index_folder = str(tmp_path / 'index')
+    SyntheticCorpus(0).write_docs(docs_folder, NUM_DOCS, spatial=(target == 'p2'))
+    run(target, '-c', LEGACY_INDEX, index_folder, docs_folder)
+    assert not os.path.exists(os.path.join(index_folder, 'manifest.json'))
+
+    output = run(target, 'index.py', '-index', index_folder, '-docs', docs_folder, '-incremental')
+    assert "rebuilding" in output
+    assert run(target, '-c', COUNT_DOCS, index_folder).split() == [str(NUM_DOCS), str(NUM_DOCS)]
+
+    # Ya con manifiesto, una segunda ejecución no cambia nada
+    output = run(target, 'index.py', '-index', index_folder, '-docs', docs_folder, '-incremental')
+    assert "0 added, 0 updated, 0 deleted" in output
+    assert run(target, '-c', COUNT_DOCS, index_folder).split() == [str(NUM_DOCS), str(NUM_DOCS)]